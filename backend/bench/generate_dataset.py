@@ -0,0 +1,143 @@
+"""
+ベンチマーク用の合成データを投入する（Postgres 専用）
+
+    python -m bench.generate_dataset --products 10000 --history-per-product 1000
+
+商品は item_id が "bench" で始まり、キーワード "bench:<n>" に紐付く（keywords / keyword_items）。
+価格履歴は1行ごとに価格が変わる（run-length 形式で圧縮されない）最悪ケースとして作り、
+日次・週次の集計 (price_rollups) も作り直す。--reset で前回の合成データを削除してから投入する。
+
+DISTINCT ON / LATERAL / ON CONFLICT など Postgres 固有のSQLを使っているため、SQLite は対象外。
+"""
+import time
+import asyncio
+import argparse
+from sqlalchemy import text
+
+from database import async_session
+from scraper import ITEM_BASE_URL
+# 投入後に GET /products の ETag が変わるよう、data_versions を進めるイベントを登録する
+import response_cache
+
+# 1トランザクションで履歴を作る商品数（10M 行を一度に入れると WAL とロックが肥大するため）
+HISTORY_CHUNK_PRODUCTS = 200
+
+DELETE_BENCH_SQL = text("DELETE FROM products WHERE item_id LIKE 'bench%'")
+DELETE_BENCH_KEYWORDS_SQL = text("DELETE FROM keywords WHERE keyword LIKE 'bench:%'")
+
+INSERT_PRODUCTS_SQL = text("""
+INSERT INTO products (item_id, name, url, image_url, searched_keyword, is_tracking, created_at)
+SELECT
+    'bench' || lpad(g::text, 8, '0'),
+    'ベンチマーク商品 ' || g,
+    CASE WHEN g % 10 = 9
+        THEN CAST(:base_url AS text) || '/shops/product/' || lpad(g::text, 11, '0')
+        ELSE CAST(:base_url AS text) || '/item/m' || lpad(g::text, 11, '0')
+    END,
+    'https://static.example.invalid/thumb/' || g || '.jpg',
+    'bench:' || (g % :keywords),
+    g <= :tracked,
+    now() - g * interval '1 minute'
+FROM generate_series(1, :products) AS g
+ON CONFLICT (item_id) DO NOTHING
+""")
+
+INSERT_KEYWORDS_SQL = text("""
+INSERT INTO keywords (keyword, created_at)
+SELECT DISTINCT searched_keyword, now()
+FROM products
+WHERE item_id LIKE 'bench%'
+ON CONFLICT (keyword) DO NOTHING
+""")
+
+INSERT_KEYWORD_ITEMS_SQL = text("""
+INSERT INTO keyword_items (keyword_id, product_id, first_seen, last_seen)
+SELECT k.id, p.id, p.created_at, now()
+FROM products p
+JOIN keywords k ON k.keyword = p.searched_keyword
+WHERE p.item_id LIKE 'bench%'
+ON CONFLICT (keyword_id, product_id) DO NOTHING
+""")
+
+# 1時間おきに価格が変わる履歴。直近 :per_product 時間分を作る
+INSERT_HISTORY_SQL = text("""
+INSERT INTO price_histories (product_id, price, scraped_at, last_seen)
+SELECT
+    p.id,
+    1000 + ((p.id * 7919 + s * 104729) % 200) * 100,
+    date_trunc('hour', now()) - s * interval '1 hour',
+    date_trunc('hour', now()) - s * interval '1 hour' + interval '50 minutes'
+FROM products p
+CROSS JOIN generate_series(1, :per_product) AS s
+WHERE p.item_id LIKE 'bench%' AND p.id >= :lo AND p.id < :hi
+""")
+
+ROLLUP_SQL = """
+INSERT INTO price_rollups
+    (product_id, resolution, bucket, open_price, open_at, min_price, max_price, last_price, last_at)
+SELECT
+    h.product_id,
+    '{resolution}',
+    date_trunc('{resolution}', h.scraped_at),
+    (array_agg(h.price ORDER BY h.scraped_at, h.id))[1],
+    min(h.scraped_at),
+    min(h.price),
+    max(h.price),
+    (array_agg(h.price ORDER BY h.scraped_at DESC, h.id DESC))[1],
+    max(h.scraped_at)
+FROM price_histories h
+WHERE h.product_id >= :lo AND h.product_id < :hi
+GROUP BY h.product_id, date_trunc('{resolution}', h.scraped_at)
+ON CONFLICT (product_id, resolution, bucket) DO NOTHING
+"""
+
+
+async def generate(products: int, per_product: int, tracked: int, keywords: int, reset: bool):
+    started = time.perf_counter()
+    async with async_session() as db:
+        if reset:
+            # 履歴・集計・キーワードとの紐付けは ON DELETE CASCADE で消える
+            await db.execute(DELETE_BENCH_SQL)
+            await db.execute(DELETE_BENCH_KEYWORDS_SQL)
+        await db.execute(INSERT_PRODUCTS_SQL, {
+            "products": products,
+            "tracked": tracked,
+            "keywords": keywords,
+            "base_url": ITEM_BASE_URL,
+        })
+        await db.execute(INSERT_KEYWORDS_SQL)
+        await db.execute(INSERT_KEYWORD_ITEMS_SQL)
+        lo, hi = (await db.execute(text(
+            "SELECT min(id), max(id) FROM products WHERE item_id LIKE 'bench%'"
+        ))).one()
+        await db.commit()
+    print(f"products: {hi - lo + 1} rows (ids {lo}..{hi}) in {time.perf_counter() - started:.1f}s")
+
+    for start in range(lo, hi + 1, HISTORY_CHUNK_PRODUCTS):
+        params = {"lo": start, "hi": start + HISTORY_CHUNK_PRODUCTS}
+        async with async_session() as db:
+            await db.execute(INSERT_HISTORY_SQL, {**params, "per_product": per_product})
+            for resolution in ("day", "week"):
+                await db.execute(text(ROLLUP_SQL.format(resolution=resolution)), params)
+            await db.commit()
+        done = min(start + HISTORY_CHUNK_PRODUCTS, hi + 1) - lo
+        print(f"history: {done * per_product:,} rows ({done}/{hi - lo + 1} products) {time.perf_counter() - started:.1f}s", end="\r")
+
+    async with async_session() as db:
+        # 大量投入の直後はプランナの統計が古いので更新しておく
+        for table in ("products", "keyword_items", "price_histories", "price_rollups"):
+            await db.execute(text(f"ANALYZE {table}"))
+        await db.commit()
+    print(f"\ndone in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成データを投入する")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--history-per-product", type=int, default=1_000)
+    parser.add_argument("--tracked", type=int, default=None, help="is_tracking にする件数（既定: 全件）")
+    parser.add_argument("--keywords", type=int, default=20, help="キーワードの種類数")
+    parser.add_argument("--reset", action="store_true", help="前回の合成データを削除してから投入する")
+    args = parser.parse_args()
+    tracked = args.products if args.tracked is None else args.tracked
+    asyncio.run(generate(args.products, args.history_per_product, tracked, args.keywords, args.reset))
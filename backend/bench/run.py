@@ -0,0 +1,362 @@
+"""
+ベンチマークの実行（スループットと p50/p95/p99 レイテンシを表示する）
+
+    # API のベンチマーク（バックエンドはスタブサーバーに向けて起動しておく）
+    python -m bench.run --api http://localhost:8002 products history track-keyword check-all
+
+    # スクレイパー単体のベンチマーク（スタブサーバーに直接アクセスする）
+    python -m bench.run --stub http://localhost:8100 scrape search
+
+    # 保存済みの商品ページ（bench/fixtures/item_*.html）に対する抽出の確認と計測（ネットワーク不要）
+    python -m bench.run extract
+
+データは bench.generate_dataset で投入しておく。--json で結果を機械可読な形式でも出力する。
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+import httpx
+
+# ジョブの完了を確認する間隔（秒）
+JOB_POLL_SECONDS = 0.5
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(name: str, samples, elapsed: float, errors: int = 0, **extra) -> dict:
+    return {
+        "name": name,
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_per_s": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 95) * 1000, 1),
+        "p99_ms": round(percentile(samples, 99) * 1000, 1),
+        **extra,
+    }
+
+
+def print_table(results):
+    print(f"{'benchmark':<28}{'n':>7}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(
+            f"{r['name']:<28}{r['requests']:>7}{r['errors']:>6}{r['throughput_per_s']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        )
+        extra = {k: v for k, v in r.items() if k not in (
+            "name", "requests", "errors", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms")}
+        if extra:
+            print(f"{'':<28}{extra}")
+
+
+async def run_load(name: str, make_call, requests: int, concurrency: int, warmup: int = 5) -> dict:
+    """make_call() を requests 回、concurrency 並列で実行してレイテンシを集める"""
+    for _ in range(warmup):
+        await make_call()
+
+    samples, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await make_call()
+                samples.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, samples, time.perf_counter() - started, errors)
+
+
+# --- API ---
+
+async def _get_ok(client: httpx.AsyncClient, url: str, **params):
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    return response
+
+
+async def bench_products(client, args) -> list:
+    results = []
+    results.append(await run_load(
+        "GET /products?limit=50",
+        lambda: _get_ok(client, "/products", limit=50),
+        args.requests, args.concurrency,
+    ))
+
+    # 先頭ページ以外のカーソル（キーセットページングの深いページ）
+    cursors = []
+    response = await _get_ok(client, "/products", limit=500)
+    while response.headers.get("X-Next-Cursor") and len(cursors) < 20:
+        cursors.append(response.headers["X-Next-Cursor"])
+        response = await _get_ok(client, "/products", limit=500, cursor=cursors[-1])
+    if cursors:
+        results.append(await run_load(
+            "GET /products (cursor)",
+            lambda: _get_ok(client, "/products", limit=50, cursor=random.choice(cursors)),
+            args.requests, args.concurrency,
+        ))
+
+    # 全件のストリーミング（1回ごとの所要時間）
+    async def stream_all():
+        rows = 0
+        async with client.stream("GET", "/products", params={"format": "ndjson"}) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_lines():
+                rows += 1
+        return rows
+
+    rows = await stream_all()
+    results.append({**await run_load("GET /products ndjson (all)", stream_all, 5, 1, warmup=0), "rows": rows})
+    return results
+
+
+async def _bench_product_ids(client) -> list:
+    response = await _get_ok(client, "/products", limit=1000)
+    ids = [p["id"] for p in response.json() if not str(p.get("url", "")).startswith("search://")]
+    if not ids:
+        raise SystemExit("商品がありません。先に python -m bench.generate_dataset を実行してください")
+    return ids
+
+
+async def bench_history(client, args) -> list:
+    ids = await _bench_product_ids(client)
+    now = datetime.now()
+    results = []
+    for label, days in (("7d raw", 7), ("60d hour", 60), ("1y day", 365), ("3y week", 1095)):
+        params = {"from": (now - timedelta(days=days)).isoformat(), "to": now.isoformat()}
+        results.append(await run_load(
+            f"GET history {label}",
+            lambda params=params: _get_ok(client, f"/products/{random.choice(ids)}/history", **params),
+            args.requests, args.concurrency,
+        ))
+    return results
+
+
+async def _wait_job(client, job_id: int, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = (await _get_ok(client, f"/jobs/{job_id}")).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(JOB_POLL_SECONDS)
+    raise TimeoutError(f"job {job_id} did not finish in {timeout}s")
+
+
+async def bench_track_keyword(client, args) -> list:
+    """キーワードごとに 登録 → ジョブ完了 までの時間を測る（初回は全件、2回目は差分スキャン）"""
+    results = []
+    run_id = int(time.time())
+    for incremental_pass in (False, True):
+        samples, errors, items = [], 0, 0
+        started = time.perf_counter()
+        for i in range(args.keywords):
+            keyword = f"bench-kw-{run_id}-{i}"
+            t0 = time.perf_counter()
+            response = await client.post("/track-keyword", params={"keyword": keyword, "incremental": incremental_pass})
+            response.raise_for_status()
+            job = await _wait_job(client, response.json()["job_id"], args.job_timeout)
+            if job["status"] != "succeeded":
+                errors += 1
+                continue
+            samples.append(time.perf_counter() - t0)
+            items += (job["result"] or {}).get("items_count", 0)
+        name = "track-keyword (rescan)" if incremental_pass else "track-keyword (first)"
+        results.append(summarize(name, samples, time.perf_counter() - started, errors, items=items))
+    return results
+
+
+async def bench_check_all(client, args) -> list:
+    t0 = time.perf_counter()
+    response = await client.post("/products/check-all")
+    response.raise_for_status()
+    job = await _wait_job(client, response.json()["job_id"], args.job_timeout)
+    elapsed = time.perf_counter() - t0
+    result = job.get("result") or {}
+    checked = result.get("checked", job.get("processed") or 0)
+    return [{
+        **summarize("check-all (job)", [elapsed], elapsed, 1 if job["status"] != "succeeded" else 0),
+        "checked": checked,
+        "products_per_s": round(checked / elapsed, 2) if elapsed else 0.0,
+        "updated": result.get("updated"),
+        "deleted": result.get("deleted"),
+    }]
+
+
+# --- スクレイパー単体 ---
+
+def _use_stub(stub_url: str):
+    # scraper はインポート時に URL を読むので、その前に環境変数を設定する
+    os.environ["SEARCH_URL"] = stub_url
+    os.environ["ITEM_BASE_URL"] = stub_url
+
+
+async def bench_scrape(args) -> list:
+    from scraper import scrape_site, item_url
+    from browser_pool import browser_pool
+    import html_extract
+
+    cases = [
+        ("scrape standard (fast)", lambda i: item_url(f"m{10**10 + i * 10 + 1}")),
+        ("scrape shops (browser)", lambda i: item_url(f"{10**10 + i}", shops=True)),
+    ]
+    results = []
+    await browser_pool.start()
+    try:
+        for name, make_url in cases:
+            counter = iter(range(10**9))
+            results.append(await run_load(
+                name,
+                lambda make_url=make_url: _expect_success(scrape_site(make_url(next(counter)))),
+                args.requests, args.concurrency,
+            ))
+
+        # 高速パスを無効にして、通常出品もブラウザで取得した場合と比較する
+        html_extract.FAST_PATH_ENABLED = False
+        counter = iter(range(10**9))
+        results.append(await run_load(
+            "scrape standard (browser)",
+            lambda: _expect_success(scrape_site(item_url(f"m{10**10 + next(counter) * 10 + 1}"))),
+            args.requests, args.concurrency,
+        ))
+    finally:
+        html_extract.FAST_PATH_ENABLED = True
+        await browser_pool.stop()
+        await html_extract.close_client()
+    return results
+
+
+async def _expect_success(call):
+    result = await call
+    if result["status"] != "success":
+        raise RuntimeError(result.get("message"))
+    return result
+
+
+# 保存済みの商品ページと、期待する売り切れ判定
+EXTRACT_FIXTURES = {
+    "item_standard": False,
+    "item_sold_out": True,
+    "item_shops": False,
+}
+
+
+async def _extract_fixture(template: str, item_id: str):
+    from scraper import extract_item_from_html
+    from bench.stub_server import render_fixture, item_context
+
+    context = item_context(item_id, price_change_rate=0)
+    found = await extract_item_from_html(render_fixture(template, **{**context, "render_delay_ms": 0}))
+    expected = {"name": context["name"], "price": context["price"], "sold_out": EXTRACT_FIXTURES[template]}
+    actual = {k: found[k] for k in expected}
+    if actual != expected:
+        raise AssertionError(f"{template}: expected {expected}, got {actual} (sources: {found['sources']})")
+    return found
+
+
+async def bench_extract(args) -> list:
+    """bench/fixtures の商品ページを set_content で読み込み、extract_item の結果を確認しながら計測する"""
+    from browser_pool import browser_pool
+
+    results = []
+    await browser_pool.start()
+    try:
+        for template in EXTRACT_FIXTURES:
+            # 計測の前に1回実行し、抽出結果が期待どおりでなければ止める
+            await _extract_fixture(template, "m10000000001")
+            counter = iter(range(10**9))
+            results.append(await run_load(
+                f"extract {template}",
+                lambda template=template: _extract_fixture(template, f"m{10**10 + next(counter)}"),
+                args.requests, args.concurrency,
+            ))
+    finally:
+        await browser_pool.stop()
+    return results
+
+
+async def bench_search(args) -> list:
+    from scraper import search_items
+    from browser_pool import browser_pool
+
+    samples, errors, items = [], 0, 0
+    await browser_pool.start()
+    try:
+        started = time.perf_counter()
+        for i in range(args.keywords):
+            t0 = time.perf_counter()
+            found = await search_items(f"bench search {i}")
+            if not found:
+                errors += 1
+                continue
+            samples.append(time.perf_counter() - t0)
+            items += len(found)
+        elapsed = time.perf_counter() - started
+    finally:
+        await browser_pool.stop()
+    return [summarize("search_items", samples, elapsed, errors, items=items)]
+
+
+API_BENCHMARKS = {
+    "products": bench_products,
+    "history": bench_history,
+    "track-keyword": bench_track_keyword,
+    "check-all": bench_check_all,
+}
+SCRAPER_BENCHMARKS = {
+    "scrape": bench_scrape,
+    "search": bench_search,
+    "extract": bench_extract,
+}
+
+
+async def main(args):
+    results = []
+    api_names = [n for n in args.benchmarks if n in API_BENCHMARKS]
+    if api_names:
+        async with httpx.AsyncClient(base_url=args.api, timeout=120.0) as client:
+            for name in api_names:
+                results.extend(await API_BENCHMARKS[name](client, args))
+    for name in args.benchmarks:
+        if name in SCRAPER_BENCHMARKS:
+            results.extend(await SCRAPER_BENCHMARKS[name](args))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmarks": results, "args": vars(args), "at": datetime.now().isoformat()}, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API / スクレイパーのベンチマーク")
+    parser.add_argument("benchmarks", nargs="+", choices=[*API_BENCHMARKS, *SCRAPER_BENCHMARKS])
+    parser.add_argument("--api", default="http://localhost:8002", help="バックエンドのURL")
+    parser.add_argument("--stub", default="http://127.0.0.1:8100", help="スタブサーバーのURL（scrape / search 用）")
+    parser.add_argument("--requests", type=int, default=200, help="1ベンチマークあたりのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--keywords", type=int, default=5, help="track-keyword / search で使うキーワード数")
+    parser.add_argument("--job-timeout", type=float, default=1800, help="ジョブ完了を待つ最大秒数")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    if any(n in SCRAPER_BENCHMARKS for n in args.benchmarks):
+        _use_stub(args.stub)
+    sys.exit(asyncio.run(main(args)))
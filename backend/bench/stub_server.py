@@ -0,0 +1,164 @@
+"""
+ベンチマーク用のメルカリ代替サーバー（本番サイトにアクセスせずにスクレイピングを計測する）
+
+    python -m bench.stub_server --port 8100
+
+バックエンドを SEARCH_URL=http://localhost:8100 ITEM_BASE_URL=http://localhost:8100 で起動すると、
+検索・商品ページの取得がすべてこのサーバーに向く。
+
+- /item/m<数字>          通常出品（STUB_SOLD_OUT_EVERY 件に1件は売り切れ）
+- /shops/product/<英数字> Shops（価格は JS で描画されるため、ブラウザ経由の取得になる）
+- /search/?keyword=...    __NEXT_DATA__ 付きの検索ページ（ページ内から検索APIを呼ぶ）
+- /v2/entities:search     検索API（nextPageToken で STUB_SEARCH_PAGES ページまで）
+"""
+import os
+import html
+import json
+import zlib
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from string import Template
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# 何件に1件を売り切れにするか（0で売り切れなし）
+STUB_SOLD_OUT_EVERY = int(os.getenv("STUB_SOLD_OUT_EVERY", "0"))
+# リクエストごとに価格が下がる確率（値下げ検知・履歴追加の負荷を再現する）
+STUB_PRICE_CHANGE_RATE = float(os.getenv("STUB_PRICE_CHANGE_RATE", "0.1"))
+# 検索結果のページ数と1ページの件数
+STUB_SEARCH_PAGES = int(os.getenv("STUB_SEARCH_PAGES", "5"))
+STUB_SEARCH_PAGE_SIZE = int(os.getenv("STUB_SEARCH_PAGE_SIZE", "30"))
+# 応答の遅延（ミリ秒）。本番サイトの応答時間を再現する
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+# Shops ページで価格を描画するまでの時間（ミリ秒）
+STUB_RENDER_DELAY_MS = int(os.getenv("STUB_RENDER_DELAY_MS", "50"))
+
+_templates = {path.stem: Template(path.read_text(encoding="utf-8")) for path in FIXTURES.glob("*.html")}
+
+app = FastAPI()
+
+
+def _seed(value: str) -> int:
+    return zlib.crc32(value.encode())
+
+
+def base_price(item_id: str) -> int:
+    return 1000 + (_seed(item_id) % 200) * 100
+
+
+def item_context(item_id: str, price_change_rate: float = None) -> dict:
+    """商品ページに埋め込む値（価格は STUB_PRICE_CHANGE_RATE の確率で値下げされる）"""
+    rate = STUB_PRICE_CHANGE_RATE if price_change_rate is None else price_change_rate
+    price = base_price(item_id)
+    if rate and random.random() < rate:
+        price -= 100 * random.randint(1, 5)
+    return {
+        "name": f"ベンチマーク商品 {item_id}",
+        "price": price,
+        "price_display": f"{price:,}",
+        "image_url": f"https://static.example.invalid/thumb/{item_id}.jpg",
+        "render_delay_ms": STUB_RENDER_DELAY_MS,
+    }
+
+
+async def _latency():
+    if STUB_LATENCY_MS:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+
+
+def render_fixture(template: str, **context) -> str:
+    """fixtures/<template>.html に値を埋め込んだHTML"""
+    return _templates[template].safe_substitute(**context)
+
+
+def _render(template: str, **context) -> HTMLResponse:
+    return HTMLResponse(render_fixture(template, **context))
+
+
+@app.get("/item/{item_id}")
+async def item_page(item_id: str):
+    await _latency()
+    digits = "".join(c for c in item_id if c.isdigit())
+    sold_out = STUB_SOLD_OUT_EVERY and digits and int(digits) % STUB_SOLD_OUT_EVERY == 0
+    return _render("item_sold_out" if sold_out else "item_standard", **item_context(item_id))
+
+
+@app.get("/shops/product/{item_id}")
+async def shops_page(item_id: str):
+    await _latency()
+    return _render("item_shops", **item_context(item_id))
+
+
+def search_page_items(keyword: str, page: int) -> list:
+    """キーワードとページ番号から決まる検索結果（何度呼んでも同じ結果になる）"""
+    rng = random.Random(_seed(f"{keyword}:{page}"))
+    newest = 1_800_000_000 - _seed(keyword) % 86400
+    items = []
+    for i in range(STUB_SEARCH_PAGE_SIZE):
+        index = page * STUB_SEARCH_PAGE_SIZE + i
+        shops = index % 10 == 9
+        item_id = f"{_seed(keyword) % 10**6:06d}{index:05d}"
+        item_id = item_id if shops else f"m{item_id}"
+        items.append({
+            "id": item_id,
+            "name": f"{keyword} {index}",
+            "price": str(base_price(item_id) + rng.randint(0, 9) * 10),
+            "thumbnails": [f"https://static.example.invalid/thumb/{item_id}.jpg"],
+            "itemType": "ITEM_TYPE_BEYOND" if shops else "ITEM_TYPE_MERCARI",
+            # 新着順（created の降順）
+            "created": str(newest - index * 60),
+        })
+    return items
+
+
+def search_payload(keyword: str, page_token: str = None) -> dict:
+    page = int(page_token.split(":")[1]) if page_token else 0
+    items = search_page_items(keyword, page) if page < STUB_SEARCH_PAGES else []
+    next_token = f"v1:{page + 1}" if page + 1 < STUB_SEARCH_PAGES else ""
+    return {"items": items, "meta": {"nextPageToken": next_token}}
+
+
+@app.get("/search/")
+async def search_page(keyword: str, page_token: str = None):
+    await _latency()
+    payload = search_payload(keyword, page_token)
+    next_data = {"props": {"pageProps": {"initialState": {"search": {"searchItems": {"items": payload["items"]}}}}}}
+    params = {"keyword": keyword}
+    if page_token:
+        params["page_token"] = page_token
+    return _render(
+        "search",
+        keyword=html.escape(keyword),
+        next_data=json.dumps(next_data, ensure_ascii=False).replace("</", "<\\/"),
+        api_params=json.dumps(params, ensure_ascii=False),
+    )
+
+
+@app.get("/v2/entities:search")
+async def search_api(keyword: str, page_token: str = None):
+    await _latency()
+    return JSONResponse(search_payload(keyword, page_token))
+
+
+@app.get("/static/{name}")
+async def static_asset(name: str):
+    # リソース遮断の効果を測るためのダミーのCSS/JS
+    if name.endswith(".css"):
+        return Response("body{margin:0}" * 2000, media_type="text/css")
+    if name.endswith(".js"):
+        return Response("void 0;\n" * 5000, media_type="application/javascript")
+    raise HTTPException(status_code=404)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="メルカリ代替のスタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,194 @@
+import os
+import logging
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from resource_policy import apply_policy
+from metrics import scrape_phase_seconds, browser_pool_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# 同時に開けるページ(コンテキスト)数の上限
+BROWSER_MAX_CONCURRENCY = int(os.getenv("BROWSER_MAX_CONCURRENCY", "3"))
+# Chromiumのメモリ肥大を防ぐため、N ページ or M 分でブラウザを作り直す
+BROWSER_RECYCLE_PAGES = int(os.getenv("BROWSER_RECYCLE_PAGES", "200"))
+BROWSER_RECYCLE_MINUTES = float(os.getenv("BROWSER_RECYCLE_MINUTES", "30"))
+# 起動時の暖機で開くページ（外部サイトにはアクセスしない）
+WARMUP_URL = "data:text/html,<title>warmup</title><p>ok</p>"
+
+
+class _BrowserSlot:
+    """起動済みブラウザ1つ分の状態（世代）"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.launched_at = time.monotonic()
+        self.pages_served = 0
+        self.active = 0
+        self.retired = False
+
+    def is_expired(self, max_pages: int, max_minutes: float) -> bool:
+        if self.pages_served >= max_pages:
+            return True
+        return (time.monotonic() - self.launched_at) >= max_minutes * 60
+
+
+class BrowserPool:
+    """
+    アプリ全体で共有する Chromium のプール。
+    ブラウザは1つだけ起動しておき、スクレイピングごとに独立したコンテキストを払い出す。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = BROWSER_MAX_CONCURRENCY,
+        recycle_pages: int = BROWSER_RECYCLE_PAGES,
+        recycle_minutes: float = BROWSER_RECYCLE_MINUTES,
+    ):
+        self.max_concurrency = max_concurrency
+        self.recycle_pages = recycle_pages
+        self.recycle_minutes = recycle_minutes
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._current = None
+        self._retiring = []
+        self.launch_count = 0
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    @property
+    def in_use(self) -> int:
+        return self.max_concurrency - self._semaphore._value
+
+    async def start(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._current is None:
+                await self._launch()
+
+    async def stop(self):
+        async with self._lock:
+            slots = self._retiring + ([self._current] if self._current else [])
+            self._current = None
+            self._retiring = []
+            for slot in slots:
+                await self._close_browser(slot)
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+        logger.info("BrowserPool: stopped")
+
+    async def _launch(self):
+        browser = await self._playwright.chromium.launch(headless=True)
+        self._current = _BrowserSlot(browser)
+        self.launch_count += 1
+        logger.info(f"BrowserPool: launched Chromium (generation {self.launch_count})")
+
+    async def _close_browser(self, slot: _BrowserSlot):
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"BrowserPool: close failed: {e}")
+
+    def is_healthy(self) -> bool:
+        return self._current is not None and self._current.browser.is_connected()
+
+    async def _ensure_browser(self) -> _BrowserSlot:
+        """ヘルスチェックとリサイクル判定をしてから、使用するブラウザを返す"""
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+            slot = self._current
+            if slot is not None and not slot.browser.is_connected():
+                # クラッシュ等で切断されている場合は作り直す
+                logger.warning("BrowserPool: browser disconnected, relaunching")
+                slot.retired = True
+                self._current = None
+                if slot.active == 0:
+                    await self._close_browser(slot)
+                else:
+                    self._retiring.append(slot)
+            elif slot is not None and slot.is_expired(self.recycle_pages, self.recycle_minutes):
+                logger.info(f"BrowserPool: recycling browser after {slot.pages_served} pages")
+                slot.retired = True
+                self._current = None
+                if slot.active == 0:
+                    await self._close_browser(slot)
+                else:
+                    # 使用中のページがなくなった時点で閉じる
+                    self._retiring.append(slot)
+
+            if self._current is None:
+                await self._launch()
+
+            slot = self._current
+            slot.active += 1
+            slot.pages_served += 1
+            return slot
+
+    async def _release(self, slot: _BrowserSlot):
+        async with self._lock:
+            slot.active -= 1
+            if slot.retired and slot.active == 0 and slot in self._retiring:
+                self._retiring.remove(slot)
+                await self._close_browser(slot)
+
+    @asynccontextmanager
+    async def page(self, policy: str = None, **context_options):
+        """
+        独立したコンテキスト上のページを払い出す。
+        同時実行数は max_concurrency で制限される。
+        policy ("item" / "search") を指定すると不要なリソースの読み込みを遮断する。
+        """
+        context_options.setdefault("user_agent", USER_AGENT)
+        waited = time.perf_counter()
+        async with self._semaphore:
+            browser_pool_wait_seconds.observe(time.perf_counter() - waited)
+            # launch: ブラウザの確保（必要なら起動・作り直し）からページを開くまで
+            started = time.perf_counter()
+            slot = await self._ensure_browser()
+            context = None
+            try:
+                context = await slot.browser.new_context(**context_options)
+                await apply_policy(context, policy)
+                page = await context.new_page()
+                scrape_phase_seconds.labels(kind=policy or "page", phase="launch").observe(time.perf_counter() - started)
+                yield page
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.warning(f"BrowserPool: context close failed: {e}")
+                await self._release(slot)
+
+    async def warm(self):
+        """
+        ブラウザを起動し、ローカルのページを1枚開いて閉じる。
+        コンテキスト・ページ生成の初回コストを、最初のスクレイピングではなく起動時に払っておく。
+        """
+        await self.start()
+        async with self.page() as page:
+            await page.goto(WARMUP_URL, wait_until="domcontentloaded")
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.is_healthy(),
+            "in_use": self.in_use,
+            "max_concurrency": self.max_concurrency,
+            "pages_served": self._current.pages_served if self._current else 0,
+            "launch_count": self.launch_count,
+            "retiring": len(self._retiring),
+        }
+
+
+# アプリ全体で共有するインスタンス（main.py の startup/shutdown で起動・停止）
+browser_pool = BrowserPool()
@@ -0,0 +1,107 @@
+import os
+import logging
+import time
+import asyncio
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from database import async_session
+from scraper import scrape_site
+from notifier import notifier
+from ingest import record_observation
+from deletion import delete_product_ids
+
+logger = logging.getLogger(__name__)
+
+# 同時にチェックするワーカー数
+CHECK_CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", "3"))
+# 1ホストあたりの最大リクエスト数（毎秒）。対象サイトへの負荷を抑えるための上限
+SCRAPE_RATE_PER_HOST = float(os.getenv("SCRAPE_RATE_PER_HOST", "1.0"))
+
+
+class HostRateLimiter:
+    """ホストごとにリクエスト間隔を空けるシンプルなレートリミッタ"""
+
+    def __init__(self, rate_per_sec: float = SCRAPE_RATE_PER_HOST):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next_slot = defaultdict(float)
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url: str):
+        if self.interval <= 0:
+            return
+        host = urlparse(url).netloc
+        # 次に使える時刻をロック内で予約し、待機はロックの外で行う
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot[host])
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def check_product(product_id: int, name: str, url: str, limiter: HostRateLimiter) -> str:
+    """
+    1商品をスクレイピングして結果をDBに反映する。
+    戻り値: "updated" / "unchanged" / "deleted" / "error"
+    """
+    await limiter.wait(url)
+    result = await scrape_site(url)
+    if result["status"] == "error":
+        logger.warning(f"一時的なエラーのためスキップ: {name}", extra={"product_id": product_id})
+        return "error"
+
+    # 売り切れ時の削除処理（履歴はバッチに分けて削除する）
+    if result.get("sold_out") is True:
+        await delete_product_ids([product_id])
+        logger.info(f"売り切れのため削除: {name}", extra={"product_id": product_id})
+        return "deleted"
+
+    # ワーカーごとに独立したセッションを使う
+    async with async_session() as db:
+        # 価格更新処理（同じ価格なら last_seen を進めるだけ）
+        new_price = result["price"]
+        old_price = await record_observation(db, product_id, new_price)
+
+        # 価格が変わった（新しい行が追加された）場合は値下げを通知
+        if old_price is None or new_price != old_price:
+            await db.commit()
+            # コミット済みの変更だけを通知する（送信はバックグラウンドでまとめて行う）
+            if old_price and new_price < old_price:
+                notifier.notify_price_drop(name, old_price, new_price, url)
+            return "updated"
+
+        await db.commit()
+        logger.debug(f"価格変更なし: {name} (¥{new_price})")
+        return "unchanged"
+
+
+async def check_products(products, concurrency: int = CHECK_CONCURRENCY, progress=None) -> dict:
+    """
+    (id, name, url) のリストを並列にチェックし、集計結果を返す。
+    1商品の失敗は他の商品に影響しない。progress (JobProgress) があれば1件ごとに進捗を報告する。
+    """
+    limiter = HostRateLimiter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def worker(product_id, name, url):
+        async with semaphore:
+            try:
+                outcome = await check_product(product_id, name, url, limiter)
+                error = f"スクレイピング失敗: {name}" if outcome == "error" else None
+            except Exception as e:
+                logger.exception(f"商品 {name} の処理中にエラーが発生: {e}")
+                outcome, error = "error", f"{name}: {e}"
+            if progress is not None:
+                await progress.advance(error=error)
+            return outcome
+
+    outcomes = await asyncio.gather(*(worker(*p) for p in products))
+
+    return {
+        "checked": len(outcomes),
+        "updated": outcomes.count("updated"),
+        "deleted": outcomes.count("deleted"),
+        "errors": outcomes.count("error"),
+    }
@@ -0,0 +1,115 @@
+import os
+import logging
+import asyncio
+from sqlalchemy import select, func, text
+
+from database import async_session
+from models import PriceHistory, Job
+from jobs import job_queue
+from response_cache import mark_history_changed
+
+logger = logging.getLogger(__name__)
+
+# 1トランザクションで処理する product_id の幅（ロックを短く保つため小さめに）
+COMPACTION_CHUNK_PRODUCTS = int(os.getenv("COMPACTION_CHUNK_PRODUCTS", "200"))
+# チャンク間の休止（秒）。通常のクエリに割り込む余裕を残す
+COMPACTION_PAUSE_SECONDS = float(os.getenv("COMPACTION_PAUSE_SECONDS", "0.2"))
+
+# 同じ価格が連続する行を1行にまとめる。
+# 連続区間の先頭行を残して last_seen を区間内の最終観測時刻に進め、残りの行を削除する。
+COMPACT_RANGE_SQL = text("""
+WITH ordered AS (
+    SELECT
+        id,
+        product_id,
+        scraped_at,
+        COALESCE(last_seen, scraped_at) AS seen,
+        CASE WHEN price IS NOT DISTINCT FROM lag(price) OVER w THEN 0 ELSE 1 END AS is_start
+    FROM price_histories
+    WHERE product_id >= :lo AND product_id < :hi
+    WINDOW w AS (PARTITION BY product_id ORDER BY scraped_at, id)
+),
+runs AS (
+    SELECT
+        id,
+        product_id,
+        seen,
+        is_start,
+        sum(is_start) OVER (PARTITION BY product_id ORDER BY scraped_at, id) AS run_no
+    FROM ordered
+),
+run_bounds AS (
+    SELECT
+        product_id,
+        run_no,
+        min(id) FILTER (WHERE is_start = 1) AS keep_id,
+        max(seen) AS last_seen
+    FROM runs
+    GROUP BY product_id, run_no
+    HAVING count(*) > 1
+),
+bumped AS (
+    UPDATE price_histories h
+    SET last_seen = rb.last_seen
+    FROM run_bounds rb
+    WHERE h.id = rb.keep_id
+    RETURNING h.id
+)
+DELETE FROM price_histories h
+USING runs r, run_bounds rb
+WHERE h.id = r.id
+  AND r.product_id = rb.product_id
+  AND r.run_no = rb.run_no
+  AND r.is_start = 0
+RETURNING h.product_id
+""")
+
+
+async def compact_history(progress=None) -> dict:
+    """price_histories の重複行を product_id の範囲ごとに圧縮する"""
+    async with async_session() as db:
+        lo, hi = (await db.execute(
+            select(func.min(PriceHistory.product_id), func.max(PriceHistory.product_id))
+        )).one()
+    if lo is None:
+        return {"deleted_rows": 0, "chunks": 0}
+
+    chunks = (hi - lo) // COMPACTION_CHUNK_PRODUCTS + 1
+    if progress is not None:
+        await progress.set_total(chunks)
+
+    deleted = 0
+    for start in range(lo, hi + 1, COMPACTION_CHUNK_PRODUCTS):
+        # チャンクごとに別トランザクションでコミットし、長いロックを避ける
+        async with async_session() as db:
+            product_ids = (await db.execute(
+                COMPACT_RANGE_SQL, {"lo": start, "hi": start + COMPACTION_CHUNK_PRODUCTS}
+            )).scalars().all()
+            # 最新行以外も書き換わるため、圧縮した商品の履歴の ETag を変える
+            mark_history_changed(db, set(product_ids))
+            await db.commit()
+        deleted += len(product_ids)
+        if progress is not None:
+            await progress.advance()
+        await asyncio.sleep(COMPACTION_PAUSE_SECONDS)
+
+    logger.info(f"Compaction: removed {deleted} duplicate history rows")
+    return {"deleted_rows": deleted, "chunks": chunks}
+
+
+@job_queue.handler("compact_history")
+async def run_compact_history(params: dict, progress):
+    return await compact_history(progress)
+
+
+async def enqueue_compaction():
+    """圧縮ジョブを投入する（待機中・実行中のものがあれば、それを返す）"""
+    async with async_session() as db:
+        pending = (await db.execute(
+            select(Job)
+            .where(Job.kind == "compact_history", Job.status.in_(["queued", "running"]))
+            .limit(1)
+        )).scalar_one_or_none()
+        if pending:
+            return pending
+        return await job_queue.enqueue(db, "compact_history", {})
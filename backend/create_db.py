@@ -1,13 +1,10 @@
-import asyncio
-from database import engine, Base
-import models  # これをインポートすることでBaseにモデルが登録されます
+from alembic import command
+from alembic.config import Config
 
-async def init_db():
-    async with engine.begin() as conn:
-        # すべてのテーブル（products, price_histories）を作成
-        await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created successfully!")
+# テーブル作成は create_all ではなくマイグレーションで行う
+def init_db():
+    command.upgrade(Config("alembic.ini"), "head")
+    print("Database migrated to the latest revision!")
 
 if __name__ == "__main__":
-    asyncio.run(init_db())
-
+    init_db()
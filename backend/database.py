@@ -1,11 +1,21 @@
 # backend/database.py
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import text
+from contextlib import AsyncExitStack
 import os
+import asyncio
+
+from metrics import instrument_engine
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# 実行するSQLをすべてログに出す（大量に出るので調査時のみ 1 にする）
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"
+# 起動時にあらかじめ張っておく接続数（最初のリクエストが接続の確立を待たないように）
+DB_PRIME_CONNECTIONS = int(os.getenv("DB_PRIME_CONNECTIONS", "5"))
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
+instrument_engine(engine)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 class Base(DeclarativeBase):
@@ -14,4 +24,16 @@ class Base(DeclarativeBase):
 async def get_db():
     async with async_session() as session:
         yield session
-        
\ No newline at end of file
+
+async def prime_pool(connections: int = DB_PRIME_CONNECTIONS):
+    """接続を同時に connections 本張って SELECT 1 を投げ、プールに残しておく"""
+    async with AsyncExitStack() as stack:
+        conns = [await stack.enter_async_context(engine.connect()) for _ in range(connections)]
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+
+async def ping(timeout: float = 2.0):
+    """DB に SELECT 1 を投げる（/readyz 用）。失敗・タイムアウトは例外になる"""
+    async def select_one():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    await asyncio.wait_for(select_one(), timeout)
@@ -0,0 +1,66 @@
+import os
+import re
+import gzip
+import uuid
+import random
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# スクレイピング時のHTML・スクリーンショットの保存先
+DEBUG_ARTIFACTS_DIR = Path(os.getenv("DEBUG_ARTIFACTS_DIR", "debug_artifacts"))
+# 成功したスクレイピングも保存する割合（0〜1）。失敗時は常に保存する
+DEBUG_ARTIFACTS_SAMPLE_RATE = float(os.getenv("DEBUG_ARTIFACTS_SAMPLE_RATE", "0"))
+# 保存しておく件数の上限（古いものから削除する）
+DEBUG_ARTIFACTS_MAX = int(os.getenv("DEBUG_ARTIFACTS_MAX", "50"))
+# 0 にするとスクリーンショットを撮らない（HTMLのみ）
+DEBUG_ARTIFACTS_SCREENSHOT = os.getenv("DEBUG_ARTIFACTS_SCREENSHOT", "1") == "1"
+
+
+def sampled() -> bool:
+    return DEBUG_ARTIFACTS_SAMPLE_RATE > 0 and random.random() < DEBUG_ARTIFACTS_SAMPLE_RATE
+
+
+def _slug(label: str) -> str:
+    return re.sub(r"[^\w-]+", "_", label).strip("_")[:40] or "page"
+
+
+def _write(name: str, html: str, screenshot: bytes = None) -> list:
+    DEBUG_ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+    paths = [DEBUG_ARTIFACTS_DIR / f"{name}.html.gz"]
+    with gzip.open(paths[0], "wt", encoding="utf-8") as f:
+        f.write(html)
+    if screenshot:
+        paths.append(DEBUG_ARTIFACTS_DIR / f"{name}.png")
+        paths[1].write_bytes(screenshot)
+    _prune()
+    return paths
+
+
+def _prune():
+    """保存件数が上限を超えたら、古いものから削除する（HTMLとスクリーンショットは同じ名前でまとめて1件）"""
+    captures = {}
+    for path in DEBUG_ARTIFACTS_DIR.iterdir():
+        name = path.name.split(".", 1)[0]
+        captures.setdefault(name, []).append(path)
+    for name in sorted(captures)[:max(len(captures) - DEBUG_ARTIFACTS_MAX, 0)]:
+        for path in captures[name]:
+            path.unlink(missing_ok=True)
+
+
+async def capture(page, label: str, reason: str):
+    """
+    表示中のページのHTML（gzip）とスクリーンショットを保存する。
+    ファイル名は時刻+ラベル+乱数で一意にし、書き込みはスレッドで行う。保存に失敗してもスクレイピングは止めない。
+    """
+    try:
+        html = await page.content()
+        screenshot = await page.screenshot() if DEBUG_ARTIFACTS_SCREENSHOT else None
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{reason}-{_slug(label)}-{uuid.uuid4().hex[:8]}"
+        paths = await asyncio.to_thread(_write, name, html, screenshot)
+        logger.info(f"Debug artifacts saved: {', '.join(str(p) for p in paths)}", extra={"reason": reason})
+    except Exception as e:
+        logger.warning(f"Failed to save debug artifacts for {label}: {e}")
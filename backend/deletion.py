@@ -0,0 +1,184 @@
+import os
+import logging
+import asyncio
+from sqlalchemy import select, delete, func, text, or_, and_
+
+from database import async_session
+from models import Product, PriceHistory, KeywordWatermark, Keyword, KeywordItem, Job
+from queries import keyword_members
+from jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+# 1トランザクションで削除する商品数・価格履歴の行数（ロックとWALの量を抑えるため小さめに）
+DELETE_PRODUCT_BATCH = int(os.getenv("DELETE_PRODUCT_BATCH", "200"))
+DELETE_HISTORY_BATCH = int(os.getenv("DELETE_HISTORY_BATCH", "5000"))
+# バッチ間の休止（秒）。通常のクエリに割り込む余裕を残す
+DELETE_PAUSE_SECONDS = float(os.getenv("DELETE_PAUSE_SECONDS", "0.05"))
+# 孤児行の掃除で1回に走査する price_histories.id の幅
+SWEEP_ID_RANGE = int(os.getenv("SWEEP_ID_RANGE", "50000"))
+
+HISTORY_FK_NAME = "price_histories_product_id_fkey"
+
+# 指定した商品の価格履歴を最大 :limit 行だけ削除する
+DELETE_HISTORY_CHUNK_SQL = text("""
+DELETE FROM price_histories
+WHERE id IN (
+    SELECT id FROM price_histories
+    WHERE product_id = ANY(:ids)
+    LIMIT :limit
+)
+""")
+
+# 商品が存在しない価格履歴（外部キーが CASCADE になる前に残った孤児行）を id の範囲ごとに削除する
+SWEEP_ORPHANS_SQL = text("""
+DELETE FROM price_histories h
+WHERE h.id >= :lo AND h.id < :hi
+  AND (h.product_id IS NULL OR NOT EXISTS (SELECT 1 FROM products p WHERE p.id = h.product_id))
+""")
+
+
+def keyword_criteria(keyword: str):
+    """
+    キーワードで取り込んだ商品と、その検索条件カード (search://...)。
+    他のキーワードの検索結果にも現れている商品と、個別に追跡中の商品は残す。
+    """
+    shared = (
+        select(KeywordItem.product_id)
+        .join(Keyword, Keyword.id == KeywordItem.keyword_id)
+        .where(KeywordItem.product_id == Product.id, Keyword.keyword != keyword)
+        .exists()
+    )
+    return or_(
+        and_(Product.id.in_(keyword_members(keyword)), ~shared, Product.is_tracking.is_not(True)),
+        Product.url == f"search://{keyword}",
+    )
+
+
+async def delete_product_ids(product_ids) -> int:
+    """
+    商品を価格履歴ごと削除する。履歴は DELETE_HISTORY_BATCH 行ずつ別トランザクションで消し、
+    最後に商品本体を消す（集計は外部キーの CASCADE で消え、スクレイピングタスクは product_id が NULL になる）。
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    while True:
+        async with async_session() as db:
+            result = await db.execute(DELETE_HISTORY_CHUNK_SQL, {"ids": product_ids, "limit": DELETE_HISTORY_BATCH})
+            await db.commit()
+        if (result.rowcount or 0) < DELETE_HISTORY_BATCH:
+            break
+        await asyncio.sleep(DELETE_PAUSE_SECONDS)
+
+    async with async_session() as db:
+        result = await db.execute(delete(Product).where(Product.id.in_(product_ids)))
+        await db.commit()
+    return result.rowcount or 0
+
+
+async def delete_products(criteria, progress=None) -> dict:
+    """条件に合う商品を DELETE_PRODUCT_BATCH 件ずつ削除する"""
+    async with async_session() as db:
+        ids = list((await db.execute(select(Product.id).where(criteria).order_by(Product.id))).scalars().all())
+    if progress is not None:
+        await progress.set_total(len(ids))
+
+    deleted = 0
+    for i in range(0, len(ids), DELETE_PRODUCT_BATCH):
+        batch = ids[i:i + DELETE_PRODUCT_BATCH]
+        deleted += await delete_product_ids(batch)
+        if progress is not None:
+            await progress.advance(len(batch))
+        await asyncio.sleep(DELETE_PAUSE_SECONDS)
+    return {"deleted_products": deleted}
+
+
+async def count_products(db, criteria) -> int:
+    return (await db.execute(select(func.count(Product.id)).where(criteria))).scalar_one()
+
+
+async def forget_keyword(db, keyword: str):
+    """検索条件カードと差分スキャンの位置を消す（一覧からすぐに消えるよう、先に実行する）"""
+    await db.execute(delete(Product).where(Product.url == f"search://{keyword}"))
+    await db.execute(delete(KeywordWatermark).where(KeywordWatermark.keyword == keyword))
+
+
+async def delete_keyword(keyword: str, progress=None) -> dict:
+    """キーワードだけに属する商品を削除してから、キーワード自体（keyword_items は CASCADE）を削除する"""
+    result = await delete_products(keyword_criteria(keyword), progress)
+    async with async_session() as db:
+        await db.execute(delete(Keyword).where(Keyword.keyword == keyword))
+        await db.commit()
+    return result
+
+
+@job_queue.handler("delete_keyword")
+async def run_delete_keyword(params: dict, progress):
+    keyword = params["keyword"]
+    result = await delete_keyword(keyword, progress)
+    logger.info(f"Deleted keyword '{keyword}': {result['deleted_products']} products")
+    return {"keyword": keyword, **result}
+
+
+async def history_fk_validated(db) -> bool:
+    """price_histories の外部キーが検証済み（孤児行がないことが保証されている）か"""
+    validated = (await db.execute(
+        text("SELECT convalidated FROM pg_constraint WHERE conname = :name"),
+        {"name": HISTORY_FK_NAME},
+    )).scalar_one_or_none()
+    return validated is not False
+
+
+async def sweep_orphan_history(progress=None) -> dict:
+    """孤児の価格履歴を id の範囲ごとに削除し、最後に外部キーを VALIDATE する"""
+    async with async_session() as db:
+        lo, hi = (await db.execute(select(func.min(PriceHistory.id), func.max(PriceHistory.id)))).one()
+
+    deleted = 0
+    if lo is not None:
+        chunks = (hi - lo) // SWEEP_ID_RANGE + 1
+        if progress is not None:
+            await progress.set_total(chunks)
+        for start in range(lo, hi + 1, SWEEP_ID_RANGE):
+            async with async_session() as db:
+                result = await db.execute(SWEEP_ORPHANS_SQL, {"lo": start, "hi": start + SWEEP_ID_RANGE})
+                await db.commit()
+            deleted += result.rowcount or 0
+            if progress is not None:
+                await progress.advance()
+            await asyncio.sleep(DELETE_PAUSE_SECONDS)
+
+    # 孤児行がなくなったので制約を検証済みにする（SHARE UPDATE EXCLUSIVE ロックのみで、書き込みは止めない）
+    async with async_session() as db:
+        validated = False
+        if not await history_fk_validated(db):
+            await db.execute(text(f"ALTER TABLE price_histories VALIDATE CONSTRAINT {HISTORY_FK_NAME}"))
+            await db.commit()
+            validated = True
+
+    logger.info(f"Orphan sweep: removed {deleted} history rows (constraint validated: {validated})")
+    return {"deleted_rows": deleted, "constraint_validated": validated}
+
+
+@job_queue.handler("sweep_orphan_history")
+async def run_sweep_orphan_history(params: dict, progress):
+    return await sweep_orphan_history(progress)
+
+
+async def enqueue_orphan_sweep(force: bool = False):
+    """
+    孤児行の掃除ジョブを投入する。外部キーが検証済みなら何もしない（一度きりの処理）。
+    待機中・実行中のものがあれば、それを返す。
+    """
+    async with async_session() as db:
+        if not force and await history_fk_validated(db):
+            return None
+        pending = (await db.execute(
+            select(Job)
+            .where(Job.kind == "sweep_orphan_history", Job.status.in_(["queued", "running"]))
+            .limit(1)
+        )).scalar_one_or_none()
+        if pending:
+            return pending
+        return await job_queue.enqueue(db, "sweep_orphan_history", {})
@@ -8,24 +8,18 @@ until nc -z tracker-db 5432; do
   sleep 1
 done
 
-echo "PostgreSQL is up - executing table creation"
+# スクレイピング専用ワーカー（マイグレーションは API 側のコンテナが行う）
+if [ "$1" = "worker" ]; then
+  echo "Starting scrape worker..."
+  exec python worker.py
+fi
 
-# インラインでテーブル作成を実行
-python -c "
-import asyncio
-from database import engine
-from sqlmodel import SQLModel
-import models
+echo "PostgreSQL is up - applying migrations"
 
-async def init():
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+# スキーマはマイグレーションで管理する (migrations/versions)
+alembic upgrade head
 
-if __name__ == '__main__':
-    asyncio.run(init())
-"
-
-echo "Tables created successfully"
+echo "Migrations applied successfully"
 
 # アプリケーション起動
 echo "Starting FastAPI server..."
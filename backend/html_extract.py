@@ -0,0 +1,186 @@
+import os
+import logging
+import json
+from collections import Counter
+from html.parser import HTMLParser
+import httpx
+
+from browser_pool import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+# ブラウザを使わず HTTP で取得する高速パス（0で無効）
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+FAST_PATH_TIMEOUT = float(os.getenv("FAST_PATH_TIMEOUT", "15"))
+
+SOLD_OUT_AVAILABILITY = ("soldout", "outofstock", "discontinued")
+
+
+def clean_name(name: str) -> str:
+    # 末尾のショップ名を削るなどのクリーンアップ
+    return name.replace(" - メルカリ", "").replace(" - ピットスポーツ", "").strip()
+
+
+def parse_product_ld_json(scripts) -> dict:
+    """
+    application/ld+json の中身(文字列のリスト)から Product を探し、
+    name / price / image_url / availability を返す（見つからない項目は None）
+    """
+    found = {"name": None, "price": None, "image_url": None, "availability": None}
+    for i, s in enumerate(scripts):
+        try:
+            data = json.loads(s)
+            items = data.get("@graph", [data]) if isinstance(data, dict) else []
+            for item in items:
+                if item.get("@type") == "Product":
+                    found["name"] = item.get("name")
+                    found["image_url"] = item.get("image")
+                    offers = item.get("offers", {})
+                    offer = (offers[0] if offers else {}) if isinstance(offers, list) else offers
+                    # 価格の抽出 (数値として取得)
+                    price_val = offer.get("price")
+                    if price_val:
+                        found["price"] = int(float(price_val))
+                    found["availability"] = offer.get("availability")
+                    return found
+        except Exception as e:
+            logger.debug(f"Error parsing script {i}: {e}")
+            continue
+    return found
+
+
+class _HeadParser(HTMLParser):
+    """JSON-LD と meta[property] だけを集める軽量パーサ"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.ld_json = []
+        self.meta = {}
+        self._in_ld_json = False
+        self._buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "script" and (attrs.get("type") or "").lower() == "application/ld+json":
+            self._in_ld_json = True
+            self._buffer = []
+        elif tag == "meta" and attrs.get("property") and attrs.get("content") is not None:
+            self.meta.setdefault(attrs["property"], attrs["content"])
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._in_ld_json:
+            self.ld_json.append("".join(self._buffer))
+            self._in_ld_json = False
+
+    def handle_data(self, data):
+        if self._in_ld_json:
+            self._buffer.append(data)
+
+
+def extract_from_html(html: str) -> dict:
+    """サーバーレンダリングされたHTMLから商品情報を取り出す（ブラウザ不要）"""
+    parser = _HeadParser()
+    parser.feed(html)
+    found = parse_product_ld_json(parser.ld_json)
+    # 各項目をどこから取得したか（JSON-LD / meta）
+    found["sources"] = {key: "ld_json" if found[key] else None for key in ("name", "price", "image_url")}
+
+    if not found["name"] and parser.meta.get("og:title"):
+        found["name"] = clean_name(parser.meta["og:title"])
+        found["sources"]["name"] = "meta"
+    if not found["price"] and parser.meta.get("product:price:amount"):
+        try:
+            found["price"] = int(float(parser.meta["product:price:amount"]))
+            found["sources"]["price"] = "meta"
+        except ValueError:
+            pass
+    if not found["image_url"] and parser.meta.get("og:image"):
+        found["image_url"] = parser.meta["og:image"]
+        found["sources"]["image_url"] = "meta"
+    if isinstance(found["image_url"], list):
+        found["image_url"] = found["image_url"][0] if found["image_url"] else None
+    return found
+
+
+class FastPathStats:
+    """高速パスでブラウザ起動を省けた回数（hit）と、フォールバックした回数（miss）"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = Counter()
+
+    def snapshot(self) -> dict:
+        total_misses = sum(self.misses.values())
+        total = self.hits + total_misses
+        return {
+            "hits": self.hits,
+            "misses": total_misses,
+            "miss_reasons": dict(self.misses),
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
+
+
+fast_path_stats = FastPathStats()
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """プロセス全体で使い回す HTTP クライアント（コネクションをプールする）"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "ja,en;q=0.8"},
+            timeout=FAST_PATH_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_item_fast(url: str):
+    """
+    HTTP だけで商品ページを解析する。
+    必須項目（名前・価格・在庫状態）が揃わなければ None を返し、呼び出し側で Playwright にフォールバックする。
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+    try:
+        response = await get_client().get(url)
+    except httpx.HTTPError as e:
+        fast_path_stats.misses["http_error"] += 1
+        logger.debug(f"Fast path request failed: {e}")
+        return None
+    if response.status_code != 200:
+        fast_path_stats.misses[f"status_{response.status_code}"] += 1
+        return None
+
+    found = extract_from_html(response.text)
+    if not found["name"]:
+        fast_path_stats.misses["missing_name"] += 1
+        return None
+    if not found["price"]:
+        # Shops など、価格がJSで描画されるページ
+        fast_path_stats.misses["missing_price"] += 1
+        return None
+    if not found["availability"]:
+        # 売り切れ判定ができないとチェック結果が変わるため、ブラウザで確認する
+        fast_path_stats.misses["missing_availability"] += 1
+        return None
+
+    fast_path_stats.hits += 1
+    availability = found["availability"].rsplit("/", 1)[-1].lower()
+    return {
+        "status": "success",
+        "name": found["name"],
+        "price": int(found["price"]),
+        "image_url": str(found["image_url"]) if found["image_url"] else None,
+        "sold_out": availability in SOLD_OUT_AVAILABILITY,
+        "sources": found["sources"],
+    }
@@ -0,0 +1,170 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import Product, PriceHistory, KeywordWatermark, Keyword, KeywordItem
+from rollups import update_rollups
+
+# ウォーターマークに覚えておくアイテムIDの数
+WATERMARK_RECENT_IDS = 50
+# 1ステートメントあたりの行数（asyncpg のパラメータ数上限を超えないように分割）
+BULK_CHUNK_SIZE = 1000
+
+
+def _chunks(rows, size=BULK_CHUNK_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+async def latest_prices(db, product_ids) -> dict:
+    """product_id -> (最新の履歴ID, 最新価格) を DISTINCT ON で1クエリ取得する"""
+    latest = {}
+    for ids in _chunks(list(product_ids)):
+        stmt = (
+            select(PriceHistory.product_id, PriceHistory.id, PriceHistory.price)
+            .where(PriceHistory.product_id.in_(ids))
+            .distinct(PriceHistory.product_id)
+            .order_by(PriceHistory.product_id, PriceHistory.scraped_at.desc(), PriceHistory.id.desc())
+        )
+        result = await db.execute(stmt)
+        latest.update({product_id: (history_id, price) for product_id, history_id, price in result.all()})
+    return latest
+
+
+async def record_observation(db, product_id: int, price: int, now: datetime = None):
+    """
+    1商品の価格観測を記録する。価格が前回と同じなら最新行の last_seen を進めるだけで、
+    変わった場合のみ新しい行を追加する。戻り値は前回の価格（初回は None）。
+    """
+    now = now or datetime.now()
+    latest = (await latest_prices(db, [product_id])).get(product_id)
+    if latest and latest[1] == price:
+        await db.execute(update(PriceHistory).where(PriceHistory.id == latest[0]).values(last_seen=now))
+    else:
+        db.add(PriceHistory(product_id=product_id, price=price, scraped_at=now, last_seen=now))
+        await update_rollups(db, [(product_id, price, now)])
+    return latest[1] if latest else None
+
+
+async def upsert_keyword(db, keyword: str) -> int:
+    """キーワードを登録し（既にあればそのまま）、id を返す"""
+    stmt = pg_insert(Keyword).values(keyword=keyword, created_at=datetime.now())
+    # DO NOTHING だと既存行が RETURNING されないため、同じ値で更新して id を受け取る
+    stmt = stmt.on_conflict_do_update(index_elements=[Keyword.keyword], set_={"keyword": stmt.excluded.keyword})
+    return (await db.execute(stmt.returning(Keyword.id))).scalar_one()
+
+
+async def ingest_search_items(db, keyword: str, items) -> dict:
+    """
+    検索結果を一括で取り込む。
+    Product は item_id をキーに INSERT ... ON CONFLICT でまとめて登録/更新し、
+    価格が前回から変わった商品だけ PriceHistory を複数行 INSERT する。
+    商品と履歴はキーワードをまたいで共有し、キーワードとの対応は keyword_items に記録する
+    （他のキーワードで取り込み済みの商品も、このキーワードの一覧に出る）。
+    コミットは呼び出し側で行う。
+    """
+    now = datetime.now()
+
+    # 同じ item_id が1ステートメントに2回出ると ON CONFLICT が失敗するため重複を除く
+    unique_items = {}
+    for item in items:
+        unique_items[item["id"]] = item
+
+    product_rows = [
+        {
+            "item_id": item["id"],
+            "name": item["name"],
+            "url": item["url"],
+            "image_url": item["image_url"],
+            "searched_keyword": keyword,
+            "is_tracking": False,
+            "created_at": now,
+        }
+        for item in unique_items.values()
+    ]
+
+    ids_by_item = {}
+    for rows in _chunks(product_rows):
+        stmt = pg_insert(Product).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.item_id],
+            set_={
+                "name": stmt.excluded.name,
+                "image_url": stmt.excluded.image_url,
+            },
+        ).returning(Product.id, Product.item_id)
+        result = await db.execute(stmt)
+        ids_by_item.update({item_id: product_id for product_id, item_id in result.all()})
+
+    keyword_id = await upsert_keyword(db, keyword)
+    member_rows = [
+        {"keyword_id": keyword_id, "product_id": product_id, "first_seen": now, "last_seen": now}
+        for product_id in ids_by_item.values()
+    ]
+    new_members = 0
+    for rows in _chunks(member_rows):
+        stmt = pg_insert(KeywordItem).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[KeywordItem.keyword_id, KeywordItem.product_id],
+            set_={"last_seen": stmt.excluded.last_seen},
+        ).returning(KeywordItem.first_seen)
+        # first_seen が今回の時刻なら、このキーワードでは初めて現れた商品
+        new_members += sum(1 for first_seen in (await db.execute(stmt)).scalars() if first_seen == now)
+
+    previous = await latest_prices(db, ids_by_item.values())
+
+    history_rows = []
+    unchanged_ids = []
+    for item_id, item in unique_items.items():
+        product_id = ids_by_item[item_id]
+        latest = previous.get(product_id)
+        # 前回観測から価格が変わっていない場合は、最新行の last_seen だけ進める
+        if latest and latest[1] == item["price"]:
+            unchanged_ids.append(latest[0])
+            continue
+        history_rows.append({
+            "product_id": product_id,
+            "price": item["price"],
+            "scraped_at": now,
+            "last_seen": now,
+        })
+
+    for rows in _chunks(history_rows):
+        await db.execute(insert(PriceHistory).values(rows))
+        await update_rollups(db, [(r["product_id"], r["price"], r["scraped_at"]) for r in rows])
+    for ids in _chunks(unchanged_ids):
+        await db.execute(update(PriceHistory).where(PriceHistory.id.in_(ids)).values(last_seen=now))
+
+    return {
+        "items_count": len(unique_items),
+        "new_count": len(unique_items) - len(previous),
+        "new_members": new_members,
+        "history_count": len(history_rows),
+    }
+
+
+async def load_watermark(db, keyword: str):
+    """前回の取り込み位置を (最新の出品日時, 取り込み済みIDの集合) で返す。未取得なら None"""
+    watermark = await db.get(KeywordWatermark, keyword)
+    if watermark is None:
+        return None
+    return watermark.last_created, set(watermark.recent_item_ids or [])
+
+
+async def save_watermark(db, keyword: str, items):
+    """今回取り込んだアイテムで取り込み位置を進める（コミットは呼び出し側）"""
+    if not items:
+        return
+    newest = sorted(items, key=lambda item: item.get("created") or 0, reverse=True)
+    watermark = await db.get(KeywordWatermark, keyword)
+    if watermark is None:
+        watermark = KeywordWatermark(keyword=keyword, last_created=0, recent_item_ids=[])
+        db.add(watermark)
+
+    # 今回の新着 + 前回覚えていたID を新しい順に、上限件数まで残す
+    ids = [item["id"] for item in newest]
+    seen = set(ids)
+    ids += [i for i in (watermark.recent_item_ids or []) if i not in seen]
+    watermark.recent_item_ids = ids[:WATERMARK_RECENT_IDS]
+    watermark.last_created = max(watermark.last_created or 0, newest[0].get("created") or 0)
+    watermark.updated_at = datetime.now()
@@ -0,0 +1,241 @@
+import os
+import logging
+import time
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+
+from database import async_session
+from models import Job
+from metrics import current_endpoint
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行するジョブ数
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# 新しいジョブがないときのポーリング間隔（秒）
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+# この時間ハートビートが途絶えた running ジョブは、落ちたプロセスのものとみなして再投入する
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+# 途絶えたジョブを探す間隔（秒）。起動時だけでなく、ワーカーのポーリングの合間にも定期的に行う
+JOB_STALE_SWEEP_SECONDS = float(os.getenv("JOB_STALE_SWEEP_SECONDS", "60"))
+# 進捗をDBに書き込む最小間隔（秒）
+PROGRESS_FLUSH_SECONDS = 1.0
+# 進捗がなくても実行中であることを知らせる間隔（秒）
+HEARTBEAT_SECONDS = 30.0
+
+
+class JobProgress:
+    """ハンドラから進捗を報告するためのオブジェクト（DB書き込みは間引く）"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.total = None
+        self.processed = 0
+        self.errors = 0
+        self.last_error = None
+        self._last_flush = 0.0
+
+    async def set_total(self, total: int):
+        self.total = total
+        await self.flush(force=True)
+
+    async def advance(self, count: int = 1, error: str = None):
+        self.processed += count
+        if error:
+            self.errors += 1
+            self.last_error = error
+        await self.flush()
+
+    async def flush(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < PROGRESS_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        async with async_session() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == self.job_id)
+                .values(
+                    total=self.total,
+                    processed=self.processed,
+                    errors=self.errors,
+                    last_error=self.last_error,
+                    heartbeat_at=datetime.now(),
+                )
+            )
+            await db.commit()
+
+
+class JobQueue:
+    """
+    Postgres の jobs テーブルをキューにした、プロセス内ワーカー。
+    ジョブはテーブルに残るため、再起動しても失われない。
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._handlers = {}
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._last_sweep = 0.0
+
+    def handler(self, kind: str):
+        """ジョブ種別ごとの処理を登録するデコレータ。handler(params, progress) -> result"""
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    async def enqueue(self, db, kind: str, params: dict) -> Job:
+        job = Job(kind=kind, params=params, status="queued", created_at=datetime.now())
+        db.add(job)
+        await db.commit()
+        self._wakeup.set()
+        return job
+
+    async def start(self):
+        await self._requeue_stale()
+        self._last_sweep = time.monotonic()
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        logger.info(f"JobQueue: started {self.workers} workers")
+
+    @property
+    def running(self) -> bool:
+        """ワーカーが起動していて、1つも落ちていないか（/readyz 用）"""
+        return bool(self._tasks) and not any(task.done() for task in self._tasks)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _requeue_stale(self):
+        threshold = datetime.now() - timedelta(seconds=JOB_STALE_SECONDS)
+        async with async_session() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.status == "running", Job.heartbeat_at < threshold)
+                .values(status="queued")
+            )
+            await db.commit()
+            if result.rowcount:
+                logger.warning(f"JobQueue: requeued {result.rowcount} stale jobs")
+
+    async def _maybe_requeue_stale(self):
+        """
+        JOB_STALE_SWEEP_SECONDS ごとに _requeue_stale を実行する。
+        再起動が JOB_STALE_SECONDS より早くても、落ちる前に実行中だったジョブは
+        ハートビートが古くなった時点でここで拾われる。
+        """
+        now = time.monotonic()
+        if now - self._last_sweep < JOB_STALE_SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        await self._requeue_stale()
+
+    async def _claim(self):
+        """待ちジョブを1件取り出す（複数ワーカーでも同じジョブを取らないよう SKIP LOCKED）"""
+        async with async_session() as db:
+            stmt = (
+                select(Job)
+                .where(Job.status == "queued", Job.kind.in_(list(self._handlers)))
+                .order_by(Job.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = (await db.execute(stmt)).scalar_one_or_none()
+            if job is None:
+                return None
+            job.status = "running"
+            job.started_at = datetime.now()
+            job.heartbeat_at = job.started_at
+            await db.commit()
+            return job
+
+    async def _finish(self, job_id: int, status: str, result=None, error: str = None):
+        values = {"status": status, "finished_at": datetime.now(), "result": result}
+        if error:
+            values["last_error"] = error
+        async with async_session() as db:
+            await db.execute(update(Job).where(Job.id == job_id).values(**values))
+            await db.commit()
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                await self._maybe_requeue_stale()
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"JobQueue worker {index}: claim failed: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"JobQueue worker {index}: running job {job.id} ({job.kind})", extra={"job_id": job.id, "kind": job.kind})
+            # ジョブ中のDBクエリ時間は job:<kind> として計上する
+            current_endpoint.set(f"job:{job.kind}")
+            progress = JobProgress(job.id)
+            heartbeat = asyncio.create_task(self._heartbeat(progress))
+            try:
+                result = await self._handlers[job.kind](job.params or {}, progress)
+                await progress.flush(force=True)
+                await self._finish(job.id, "succeeded", result=result)
+            except asyncio.CancelledError:
+                # シャットダウン時は queued に戻して次回起動時に再実行する
+                async with async_session() as db:
+                    await db.execute(update(Job).where(Job.id == job.id).values(status="queued"))
+                    await db.commit()
+                raise
+            except Exception as e:
+                logger.exception(f"JobQueue: job {job.id} ({job.kind}) failed", extra={"job_id": job.id, "kind": job.kind})
+                await self._finish(job.id, "failed", error=str(e))
+            finally:
+                heartbeat.cancel()
+
+    async def _heartbeat(self, progress: JobProgress):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await progress.flush(force=True)
+            except Exception as e:
+                logger.warning(f"JobQueue: heartbeat failed for job {progress.job_id}: {e}")
+
+
+def job_status(job: Job) -> dict:
+    """GET /jobs/{id} 用の表示形式。ETA は経過時間と処理件数から推定する"""
+    eta_seconds = None
+    if job.status == "running" and job.started_at and job.total and job.processed:
+        elapsed = (datetime.now() - job.started_at).total_seconds()
+        remaining = max(job.total - job.processed, 0)
+        eta_seconds = round(elapsed / job.processed * remaining, 1)
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "errors": job.errors,
+        "last_error": job.last_error,
+        "eta_seconds": eta_seconds,
+        "result": job.result,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# アプリ全体で共有するキュー（main.py の startup/shutdown で起動・停止）
+job_queue = JobQueue()
@@ -0,0 +1,68 @@
+import json
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import tuple_
+
+from database import async_session
+from models import Product
+
+# ストリーミング時に DB カーソルから1回に取り出す行数
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(product: Product) -> str:
+    """(created_at, id) を不透明なカーソル文字列にする"""
+    raw = f"{product.created_at.isoformat()}|{product.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, product_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(product_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+
+
+async def _stream_ndjson(statement, serialize, limit):
+    # StreamingResponse の送信中はリクエストのセッションが閉じられるため、専用のセッションを使う
+    async with async_session() as session:
+        result = await session.stream(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        count, last = 0, None
+        async for row in result:
+            # limit + 1 件目が来たら次のページがあるので、最後に書き出した行のカーソルを付けて終える
+            if limit and count == limit:
+                yield json.dumps({"next_cursor": encode_cursor(last)}) + "\n"
+                break
+            count += 1
+            last = row[0]
+            yield json.dumps(jsonable_encoder(serialize(*row)), ensure_ascii=False) + "\n"
+
+
+async def listing_response(db, statement, serialize, limit: int = None, cursor: str = None, format: str = "json"):
+    """
+    products_with_prices() のクエリを (created_at, id) のキーセットでページングして返す。
+    - format=json: 配列を返し、続きがあれば X-Next-Cursor ヘッダーにカーソルを入れる
+    - format=ndjson: DB カーソルから1行ずつ書き出す（全件でもメモリ使用量は一定）
+    """
+    if cursor:
+        statement = statement.where(tuple_(Product.created_at, Product.id) < decode_cursor(cursor))
+
+    if limit:
+        # 1件多く取り、次のページがあるかを判定する
+        statement = statement.limit(limit + 1)
+
+    if format == "ndjson":
+        return StreamingResponse(_stream_ndjson(statement, serialize, limit), media_type="application/x-ndjson")
+
+    rows = (await db.execute(statement)).all()
+
+    headers = {}
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1][0])
+    return JSONResponse(jsonable_encoder([serialize(*row) for row in rows]), headers=headers)
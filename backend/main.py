@@ -1,21 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, SQLModel
-from sqlalchemy import text, delete, select, and_
+from sqlalchemy import text, delete, select, and_, func
 from sqlalchemy.orm import selectinload
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
 import re
-import httpx
 import os
+import time
+import asyncio
+import logging
 
-from database import get_db, engine
-from models import Product, PriceHistory, Base
-from scraper import scrape_site, search_items
+from database import get_db, engine, async_session, prime_pool, ping
+from models import Product, PriceHistory, Job, Base
+from scraper import scrape_site, search_items, item_url
+from search_cache import search_cache
+from browser_pool import browser_pool
+from resource_policy import block_stats
+from html_extract import fast_path_stats, close_client
+from notifier import notifier
+from checker import check_products
+from queries import products_with_prices, price_change, keyword_members
+from ingest import record_observation, upsert_keyword
+from jobs import job_queue, job_status
+from scheduler import scheduler, reschedule
+from compaction import enqueue_compaction
+from rollups import history_series, auto_resolution, RESOLUTIONS
+from listing import listing_response, NEXT_CURSOR_HEADER
+from response_cache import response_cache, products_version, history_version
+from deletion import (
+    DELETE_PRODUCT_BATCH, keyword_criteria, count_products, delete_keyword,
+    delete_product_ids, forget_keyword, enqueue_orphan_sweep,
+)
+from scrape_tasks import distributed, run_search, enqueue_item_checks, enqueue_search, wait_for_job_tasks, job_task_results
+from logging_setup import setup_logging
+from startup import readiness
+import metrics
 
-# .envから取得
-DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -25,19 +50,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # ページング用のカーソルと、条件付きGET用の ETag をフロントエンドから読めるようにする
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # リクエスト中のDBクエリ時間を、ルーティング後のエンドポイントに計上できるようにする
+    metrics.current_endpoint.set(request.scope)
+    started = time.perf_counter()
+    response = await call_next(request)
+    metrics.http_request_seconds.labels(
+        method=request.method,
+        endpoint=metrics.endpoint_label(),
+        status=response.status_code,
+    ).observe(time.perf_counter() - started)
+    return response
+
+# 起動時の暖機に失敗した場合に /readyz から始める再試行
+_browser_retry = None
+
+async def warm_browser() -> bool:
+    try:
+        await browser_pool.warm()
+        readiness.browser_warm = True
+    except Exception as e:
+        logger.warning(f"Browser warm-up failed: {e}")
+    return readiness.browser_warm
+
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        # SQLModel.metadata ではなく、models.py で使っている Base.metadata を使う
-        await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created successfully using Base metadata.")
+    # テーブル作成・変更は entrypoint.sh の `alembic upgrade head` で行う
+    # DB の接続をあらかじめ張っておく
+    async with readiness.phase("db_pool"):
+        await prime_pool()
+    # 共有Chromiumを起動・暖機しておき、以降のスクレイピングで使い回す
+    # （SCRAPE_MODE=distributed ではスクレイピングは worker.py が行うため、/track で必要になった時点で起動する）
+    if not distributed():
+        async with readiness.phase("browser"):
+            # 失敗しても起動は続けるが、/readyz は暖機が成功するまで 503 を返す
+            await warm_browser()
+    # track-keyword / check-all のジョブを処理するワーカーを起動
+    async with readiness.phase("job_queue"):
+        await job_queue.start()
+        # 外部キーが CASCADE になる前に残った孤児の価格履歴を掃除する（検証済みなら何もしない）
+        await enqueue_orphan_sweep()
+    # 期限が来た商品だけを自動でチェックするスケジューラ
+    await scheduler.start()
+    # 値下げ通知をまとめて Discord に送るバックグラウンドタスク
+    await notifier.start()
+    readiness.complete()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # 停止処理中は新しいリクエストを振り分けさせない
+    readiness.ready = False
+    await scheduler.stop()
+    await job_queue.stop()
+    # 残りの通知はワーカー停止後に送り切る
+    await notifier.stop()
+    await browser_pool.stop()
+    await close_client()
 
 @app.post("/track")
 async def track_product(url: str, db: AsyncSession = Depends(get_db)):
     # デバッグログを追加（これがあればコンテナのログで何が起きているか100%分かります）
-    print(f"DEBUG: Received URL: {url}")
+    logger.debug(f"Received URL: {url}")
 
     # 1. メルカリ通常商品 (item/m123...)
     # URLの中に 'item/m...' が含まれているかをより柔軟に探す
@@ -49,15 +127,15 @@ async def track_product(url: str, db: AsyncSession = Depends(get_db)):
 
     if item_match:
         item_id = item_match.group(1)
-        clean_url = f"https://jp.mercari.com/item/{item_id}"
-        print(f"DEBUG: Matched Standard Item ID: {item_id}")
+        clean_url = item_url(item_id)
+        logger.debug(f"Matched Standard Item ID: {item_id}")
     elif shop_match:
         item_id = shop_match.group(1)
-        clean_url = f"https://jp.mercari.com/shops/product/{item_id}"
-        print(f"DEBUG: Matched Shops Product ID: {item_id}")
+        clean_url = item_url(item_id, shops=True)
+        logger.debug(f"Matched Shops Product ID: {item_id}")
     else:
         # マッチしなかった理由を詳細に返してフロントで確認できるようにする
-        print(f"DEBUG: URL Match Failed. Input was: {url}")
+        logger.info(f"URL Match Failed. Input was: {url}")
         raise HTTPException(
             status_code=400, 
             detail=f"URL形式が正しくありません。'item/m...' または 'shops/product/...' を含むURLを入力してください。受け取った値: {url}"
@@ -88,180 +166,272 @@ async def track_product(url: str, db: AsyncSession = Depends(get_db)):
         product.name = result["name"]
         product.image_url = result["image_url"]
 
-    new_history = PriceHistory(
-        product_id=product.id,
-        price=result["price"],
-        scraped_at=datetime.now()
-    )
-    db.add(new_history)
+    # 同じ価格なら最新行の last_seen を進め、変わった場合だけ履歴を追加
+    await record_observation(db, product.id, result["price"])
     await db.commit()
     await db.refresh(product)
     
     return {"message": "Success", "product": result}
 
+def serialize_product(p, current_price, last_scraped_at, previous_price):
+    # --- ここを修正：手動で辞書を作る ---
+    return {
+        "id": p.id,
+        "item_id": p.item_id,
+        "name": p.name,
+        "url": p.url,
+        "image_url": p.image_url,
+        "current_price": current_price,
+        "previous_price": previous_price,
+        "price_change": price_change(current_price, previous_price),
+        "last_scraped_at": last_scraped_at
+    }
+
 @app.get("/products")
-async def get_products(db: AsyncSession = Depends(get_db)):
-    statement = (
-        select(Product)
-        .where(Product.is_tracking == True) # 追跡中のみに絞り込む
-        .order_by(text("created_at DESC"))
+async def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    # 追跡中のみに絞り込み、最新価格は1クエリでまとめて取得する
+    # limit/cursor でページング、format=ndjson でストリーミング
+    statement = products_with_prices(Product.is_tracking == True)
+    # 前回から書き込みがなければ 304 / 保持している本文を返す（data_versions の合計を読むだけ）
+    return await response_cache.respond(
+        request,
+        await products_version(db),
+        lambda: listing_response(db, statement, serialize_product, limit, cursor, format),
+        endpoint="/products",
     )
-    results = await db.execute(statement)
-    products_db = results.scalars().all()
-    
-    response_data = []
-    for p in products_db:
-        # 価格履歴の取得
-        history_stmt = (
-            select(PriceHistory)
-            .where(PriceHistory.product_id == p.id)
-            .order_by(text("scraped_at DESC"))
-            .limit(1)
-        )
-        h_result = await db.execute(history_stmt)
-        latest_history = h_result.scalar_one_or_none()
-        
-        # --- ここを修正：手動で辞書を作る ---
-        product_data = {
-            "id": p.id,
-            "item_id": p.item_id,
-            "name": p.name,
-            "url": p.url,
-            "image_url": p.image_url,
-            "current_price": latest_history.price if latest_history else None
-        }
-        response_data.append(product_data)
-            
-    return response_data
+
+def _local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # DB の時刻はローカル時刻（タイムゾーンなし）で保存しているため、オフセット付きの指定はローカル時刻に直す
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
 
 @app.get("/products/{product_id}/history")
-async def get_product_history(product_id: int, db: AsyncSession = Depends(get_db)):
-    statement = (
-        select(PriceHistory)
-        .where(PriceHistory.product_id == product_id)
-        .order_by(text("scraped_at ASC"))
-    )
-    results = await db.execute(statement)
-    histories = results.scalars().all()
-    return histories
+async def get_product_history(
+    request: Request,
+    product_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    resolution: str = "auto",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    価格履歴を列指向のJSONで返す（t と価格の配列を並べた形式）。
+    resolution: raw / hour / day / week / auto（期間に応じて自動選択）
+    ETag は商品ごとの履歴の版数で、変わっていなければ 304 を返す。
+    """
+    if resolution != "auto" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution は auto / {' / '.join(RESOLUTIONS)} のいずれかです")
+    start, end = _local_naive(start), _local_naive(end)
 
-async def send_discord_notification(product_name, old_price, new_price, url):
-    if not DISCORD_WEBHOOK_URL:
-        return
-    
-    content = (
-        f"📉 **値下げ通知！**\n"
-        f"商品: {product_name}\n"
-        f"価格: {old_price:,}円 -> **{new_price:,}円**\n"
-        f"URL: {url}"
+    async def build():
+        nonlocal start, end, resolution
+        end = end or datetime.now()
+        if start is None:
+            # 期間の指定がなければ、最初の履歴から
+            first = await db.execute(
+                select(func.min(PriceHistory.scraped_at)).where(PriceHistory.product_id == product_id)
+            )
+            start = first.scalar_one_or_none() or end
+        if resolution == "auto":
+            resolution = auto_resolution(start, end)
+
+        series = await history_series(db, product_id, start, end + timedelta(microseconds=1), resolution)
+        return {"product_id": product_id, "from": start, "to": end, **series}
+
+    return await response_cache.respond(
+        request, await history_version(db, product_id), build, endpoint="/products/{product_id}/history"
     )
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            # タイムゾーンエラー回避のためtimeoutを長めに設定
-            await client.post(DISCORD_WEBHOOK_URL, json={"content": content}, timeout=10.0)
-        except Exception as e:
-            print(f"Discord通知失敗: {e}")
 
 @app.post("/products/check-all")
 async def check_all_products(db: AsyncSession = Depends(get_db)):
-    statement = select(Product).where(
-        and_(
-            Product.is_tracking == True,
-            ~Product.url.startswith("search://")
+    # スクレイピングはジョブとしてバックグラウンドで実行し、すぐにジョブIDを返す
+    job = await job_queue.enqueue(db, "check_all", {})
+    return {"status": "queued", "job_id": job.id}
+
+@job_queue.handler("check_all")
+async def run_check_all(params: dict, progress):
+    async with async_session() as db:
+        statement = select(Product.id, Product.name, Product.url).where(
+            and_(
+                Product.is_tracking == True,
+                ~Product.url.startswith("search://")
+            )
         )
-    )
-    results = await db.execute(statement)
-    products = results.scalars().all()
-    
-    checked_count = 0   # ← 【追加】チェックした総数
-    updated_count = 0   # 価格が変わった（履歴を追加した）数
-    deleted_count = 0   # 売り切れで削除した数
-
-    for p in products:
-        checked_count += 1  # ループの最初でカウントアップ
-        try:
-            result = await scrape_site(p.url)
-            if result["status"] == "error":
-                print(f"一時的なエラーのためスキップ: {p.name}")
-                continue
-
-            # 売り切れ時の削除処理
-            if result.get("sold_out") is True:
-                # ... (中略: 削除ロジック) ...
-                deleted_count += 1
-                continue
-
-            # 価格更新処理
-            new_price = result["price"]
-            history_stmt = select(PriceHistory).where(PriceHistory.product_id == p.id).order_by(text("scraped_at DESC")).limit(1)
-            h_result = await db.execute(history_stmt)
-            latest_history = h_result.scalar_one_or_none()
-            
-            old_price = latest_history.price if latest_history else None
-            
-            # 価格が変わった場合のみ履歴を追加
-            if old_price is None or new_price != old_price:
-                new_history = PriceHistory(
-                    product_id=p.id,
-                    price=new_price,
-                    scraped_at=datetime.now()
-                )
-                db.add(new_history)
-                if old_price and new_price < old_price:
-                    await send_discord_notification(p.name, old_price, new_price, p.url)
-                await db.commit()
-                updated_count += 1
-            else:
-                # 価格が変わらなくても、最終チェック時刻を記録したい場合はここで処理（任意）
-                print(f"価格変更なし: {p.name} (¥{new_price})")
-
-        except Exception as e:
-            print(f"商品 {p.name} の処理中にエラーが発生: {e}")
-            await db.rollback()
-            continue
+        results = await db.execute(statement)
+        products = results.all()
+    # 以降は各ワーカーが自分のセッションを使う
+    await progress.set_total(len(products))
+
+    if distributed():
+        counts = await check_products_distributed(products, progress)
+    else:
+        counts = await check_products(products, progress=progress)
+        # 一括チェックした商品も、次回の自動チェック時刻を入れ直す
+        await reschedule(p.id for p in products)
+
+    return {
+        "message": f"全{counts['checked']}件をチェック：{counts['updated']}件の価格変更を確認、{counts['deleted']}件を削除しました",
+        **counts
+    }
 
+async def check_products_distributed(products, progress) -> dict:
+    """scrape_tasks に積んで worker.py に処理させ、全件終わるまで待つ（次回チェック時刻はワーカーが入れ直す）"""
+    async with async_session() as db:
+        await enqueue_item_checks(db, products, job_id=progress.job_id)
+        await db.commit()
+    await wait_for_job_tasks(progress.job_id, progress)
+    outcomes = [
+        (result or {}).get("outcome") if status == "succeeded" else "error"
+        for status, result in await job_task_results(progress.job_id)
+    ]
     return {
-        "message": f"全{checked_count}件をチェック：{updated_count}件の価格変更を確認、{deleted_count}件を削除しました"
+        "checked": len(outcomes),
+        "updated": outcomes.count("updated"),
+        "deleted": outcomes.count("deleted"),
+        "errors": outcomes.count("error"),
     }
 
+@app.get("/stats/scraper")
+async def get_scraper_stats():
+    """ブラウザプールの使用状況と、遮断したリソースの集計"""
+    return {
+        "browser_pool": browser_pool.stats(),
+        "resource_blocking": block_stats.snapshot(),
+        "fast_path": fast_path_stats.snapshot(),
+        "search_cache": search_cache.stats(),
+    }
+
+@app.get("/healthz")
+async def healthz():
+    """プロセスが応答できるか（liveness）。依存先の状態は見ない"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    リクエストを受けられるか（readiness）。起動処理の完了・DB・ジョブキュー・ブラウザの暖機を確認し、
+    どれかが使えなければ 503 を返す（docker compose の healthcheck / Traefik の振り分けに使う）。
+    暖機が済んだ後のブラウザの切断は、使うときに起動し直されるため参考として返すだけにする。
+    """
+    global _browser_retry
+    checks = {"startup": readiness.ready, "job_queue": job_queue.running}
+    try:
+        await ping()
+        checks["db"] = True
+    except Exception as e:
+        logger.warning(f"Readiness: DB check failed: {e}")
+        checks["db"] = False
+    info = {}
+    if not distributed():
+        if not readiness.browser_warm and (_browser_retry is None or _browser_retry.done()):
+            # 暖機に失敗したままなら裏で再試行し、成功した後のチェックから ready にする
+            _browser_retry = asyncio.create_task(warm_browser())
+        checks["browser"] = readiness.browser_warm
+        info["browser_connected"] = browser_pool.is_healthy()
+
+    ready = all(checks.values())
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "unavailable",
+            "checks": checks,
+            "info": info,
+            "startup_phases": readiness.phases,
+        },
+        status_code=200 if ready else 503,
+    )
+
+@app.get("/metrics")
+async def get_metrics(db: AsyncSession = Depends(get_db)):
+    """Prometheus のテキスト形式でメトリクスを返す"""
+    # キューの深さ・プールの使用状況は取得時点の値を入れる
+    counts = dict((await db.execute(
+        select(Job.status, func.count(Job.id))
+        .where(Job.status.in_(["queued", "running"]))
+        .group_by(Job.status)
+    )).all())
+    for status in ("queued", "running"):
+        metrics.job_queue_depth.labels(status=status).set(counts.get(status, 0))
+    metrics.notification_queue_depth.set(notifier.depth)
+    metrics.browser_pool_in_use.set(browser_pool.in_use)
+    metrics.browser_pool_capacity.set(browser_pool.max_concurrency)
+    metrics.browser_pool_launches.set(browser_pool.launch_count)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/admin/compact-history")
+async def compact_history_now():
+    """価格履歴の重複行の圧縮をバックグラウンドで実行する（通常は1日1回自動で実行）"""
+    job = await enqueue_compaction()
+    return {"status": job.status, "job_id": job.id}
+
+@app.post("/admin/sweep-orphans")
+async def sweep_orphans_now():
+    """孤児の価格履歴の掃除と外部キーの検証をバックグラウンドで実行する"""
+    job = await enqueue_orphan_sweep(force=True)
+    return {"status": job.status, "job_id": job.id}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job_status(job)
+
+# --- 削除用（デコレータを追加！） ---
+# /products/{product_id} より先に登録する（後だと "search-results" が product_id として解釈される）
+@app.delete("/products/search-results")
+async def delete_search_keyword(keyword: str, db: AsyncSession = Depends(get_db)):
+    # 1. 検索条件カード(url="search://...") と差分スキャンの位置は、一覧からすぐ消えるよう先に削除
+    await forget_keyword(db, keyword)
+    await db.commit()
+
+    # 2. 取り込んだ商品と価格履歴はバッチに分けて削除する。多い場合はジョブとしてバックグラウンドで実行
+    # （他のキーワードにも出てくる商品は残し、このキーワードとの紐付けだけを消す）
+    count = await count_products(db, keyword_criteria(keyword))
+    if count > DELETE_PRODUCT_BATCH:
+        job = await job_queue.enqueue(db, "delete_keyword", {"keyword": keyword})
+        return {"status": "queued", "keyword": keyword, "products": count, "job_id": job.id}
+
+    result = await delete_keyword(keyword)
+    return {"message": f"Keyword '{keyword}' and related items deleted.", **result}
+
 @app.delete("/products/{product_id}")
 async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     # 商品の存在確認
-    statement = select(Product).where(Product.id == product_id)
-    result = await db.execute(statement)
-    product = result.scalar_one_or_none()
-    
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="商品が見つかりません")
 
-    # 関連する履歴を先に削除
-    await db.execute(
-        delete(PriceHistory).where(PriceHistory.product_id == product_id)
-    )
-    
-    # 商品本体を削除
-    await db.delete(product)
-    await db.commit()
-    
+    # 履歴が多い商品でも長いトランザクションにならないよう、履歴をバッチで消してから本体を削除
+    await delete_product_ids([product_id])
     return {"message": f"商品 ID:{product_id} を削除しました"}
 
 @app.get("/search")
-async def search(keyword: str):
+async def search(keyword: str, debug: bool = False):
     """
     キーワードを受け取り、Playwrightを使って商品を検索して返す
+    debug=true のときはキャッシュを使わずに検索し、最終画面のHTMLとスクリーンショットを保存する
     """
     if not keyword:
         return []
     
-    # scraper.py の search_items を実行
-    results = await search_items(keyword)
+    if debug:
+        results = await search_items(keyword, debug=True)
+    else:
+        # 直近の同じキーワードの結果があれば使い回す（同時に来た同じ検索は1回にまとめる）
+        results = await search_cache.search(keyword)
     
     # フロントエンドが期待する SearchResult 形式で返却
     return results
 
 @app.post("/track-keyword")
-async def track_keyword(keyword: str, db: AsyncSession = Depends(get_db)):
+async def track_keyword(keyword: str, incremental: bool = True, db: AsyncSession = Depends(get_db)):
     if not keyword:
         return {"error": "Keyword is empty"}
     
@@ -282,110 +452,73 @@ async def track_keyword(keyword: str, db: AsyncSession = Depends(get_db)):
             searched_keyword=keyword # 【追加】削除時に自分自身も消せるように
         )
         db.add(parent_card)
-        # 後で商品と紐付けたい場合はここで flush() してIDを確定させますが、
-        # 今回はシンプルに「全商品保存」を優先します。
+    await upsert_keyword(db, keyword)
 
-    # 2. スクレイピング実行（Playwright起動）
-    print(f"Starting background scrape for: {keyword}")
-    scraped_items = await search_items(keyword)
-    
-    # 3. 取得した全アイテムをDBに保存（一括処理）
-    for item in scraped_items:
-        # すでにDBにあるか確認（URLを一意のキーとする）
-        item_stmt = select(Product).where(Product.url == item["url"])
-        item_result = await db.execute(item_stmt)
-        existing_item = item_result.scalar_one_or_none()
-        
-        if existing_item:
-            # すでに存在すれば価格履歴だけ追加
-            new_history = PriceHistory(
-                product_id=existing_item.id,
-                price=item["price"]
-            )
-            db.add(new_history)
-        else:
-            # 新規商品ならProductとPriceHistoryを両方作成
-            new_product = Product(
-                item_id=item["id"],
-                name=item["name"],
-                url=item["url"],
-                image_url=item["image_url"],
-                searched_keyword=keyword, # 検索に使ったキーワードをそのまま保存！
-                created_at=datetime.now()
-            )
+    await db.commit()
 
-            db.add(new_product)
-            await db.flush() # IDを確定させる
-            
-            new_history = PriceHistory(
-                product_id=new_product.id,
-                price=item["price"]
-            )
-            db.add(new_history)
+    # 2. スクレイピングと保存はジョブとしてバックグラウンドで実行する
+    # incremental=True なら前回取り込んだ位置まででページ送りをやめる（初回は全件）
+    job = await job_queue.enqueue(db, "track_keyword", {"keyword": keyword, "incremental": incremental})
+    return {
+        "status": "queued",
+        "keyword": keyword,
+        "job_id": job.id
+    }
 
-    await db.commit()
+@job_queue.handler("track_keyword")
+async def run_track_keyword(params: dict, progress):
+    keyword = params["keyword"]
+    incremental = params.get("incremental", True)
+
+    if not distributed():
+        # スクレイピング実行（共有ブラウザを使用）
+        result = await run_search(keyword, incremental)
+        await progress.set_total(result["items_count"])
+        await progress.advance(result["items_count"])
+        return result
+
+    # 検索は worker.py に任せ、完了を待って結果を返す
+    async with async_session() as db:
+        await enqueue_search(db, keyword, incremental, job_id=progress.job_id)
+        await db.commit()
+    await progress.set_total(1)
+    await wait_for_job_tasks(progress.job_id, progress)
+    status, result = (await job_task_results(progress.job_id))[0]
+    if status != "succeeded":
+        raise RuntimeError(f"検索タスクが失敗しました: {keyword}")
+    return result
+
+# --- 追加: 保存済み商品の中から検索キーワードで取り込んだ商品を返す ---
+def serialize_search_result(p, current_price, last_scraped_at, previous_price):
     return {
-        "status": "success", 
-        "keyword": keyword, 
-        "items_count": len(scraped_items)
+        "id": p.id,
+        "name": p.name,
+        "url": p.url,
+        "image_url": p.image_url,
+        "price": current_price if current_price is not None else 0,
+        "previous_price": previous_price,
+        "price_change": price_change(current_price, previous_price),
+        "created_at": p.created_at
     }
 
-# --- 追加: 保存済み商品の中から検索キーワード(searched_keyword)でDB検索する ---
 @app.get("/products/search-results")
-async def get_search_results(keyword: str, db: AsyncSession = Depends(get_db)):
+async def get_search_results(
+    keyword: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    保存時に紐付けた検索キーワード(searched_keyword)に完全一致する商品を返す
+    キーワード（完全一致）の検索結果に現れた商品を返す。
+    他のキーワードで先に取り込まれた商品も keyword_items で紐付いているため、漏れなく出る
     """
     if not keyword:
         return []
 
-    # 1. searched_keyword カラムで検索
     # これにより、メルカリ等で検索してヒットした116件をそのまま再現できます
-    statement = (
-        select(Product)
-        .where(
-            and_(
-                Product.searched_keyword == keyword,  # 完全一致で紐付け
-                ~Product.url.startswith("search://")
-            )
-        )
-        .order_by(text("created_at DESC"))
+    statement = products_with_prices(
+        Product.id.in_(keyword_members(keyword)),
+        ~Product.url.startswith("search://")
     )
-    
-    results = await db.execute(statement)
-    products_db = results.scalars().all()
-    
-    response_data = []
-    for p in products_db:
-        # 最新価格を取得
-        history_stmt = (
-            select(PriceHistory)
-            .where(PriceHistory.product_id == p.id)
-            .order_by(text("scraped_at DESC"))
-            .limit(1)
-        )
-        h_result = await db.execute(history_stmt)
-        latest_history = h_result.scalar_one_or_none()
-        
-        response_data.append({
-            "id": p.id,
-            "name": p.name,
-            "url": p.url,
-            "image_url": p.image_url,
-            "price": latest_history.price if latest_history else 0,
-            "created_at": p.created_at
-        })
-            
-    return response_data
-
-# --- 削除用（デコレータを追加！） ---
-@app.delete("/products/search-results")    
-async def delete_search_keyword(keyword: str, db: AsyncSession = Depends(get_db)):
-    # 1. そのキーワードで保存された商品 ＋ 親カード(url="search://...") の両方を削除
-    # 親カードにも searched_keyword を入れておけば、以下の1行ですべて消せます
-    statement = delete(Product).where(
-        (Product.searched_keyword == keyword) | (Product.url == f"search://{keyword}")
-    )
-    await db.execute(statement)
-    await db.commit()
-    return {"message": f"Keyword '{keyword}' and related items deleted."}
+    return await listing_response(db, statement, serialize_search_result, limit, cursor, format)
@@ -0,0 +1,120 @@
+import time
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy import event
+
+# /metrics で出力するメトリクスの登録先（このアプリのものだけを出す）
+REGISTRY = CollectorRegistry()
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# 秒単位の既定バケット（DBクエリ〜ページ読み込みまでをカバー）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# DBクエリ時間をどのエンドポイント（またはジョブ）に計上するか
+# リクエスト中は ASGI の scope、バックグラウンドでは "job:<kind>" などの文字列が入る
+current_endpoint: ContextVar = ContextVar("current_endpoint", default="background")
+
+
+def render() -> bytes:
+    """Prometheus のテキスト形式で出力する"""
+    return generate_latest(REGISTRY)
+
+
+# --- スクレイピング ---
+scrape_phase_seconds = Histogram(
+    "scraper_phase_duration_seconds",
+    "Time spent in each scrape phase (launch = page checkout, goto, extraction, fast_path = HTTP fetch+parse)",
+    labelnames=("kind", "phase"),
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+)
+scrape_results = Counter(
+    "scraper_results_total",
+    "Scrape outcomes by path (fast / browser) and status",
+    labelnames=("path", "status"),
+    registry=REGISTRY,
+)
+extraction_sources = Counter(
+    "scraper_extraction_source_total",
+    "Which source (ld_json / meta / selector) each extracted field came from",
+    labelnames=("field", "source"),
+    registry=REGISTRY,
+)
+browser_pool_wait_seconds = Histogram(
+    "browser_pool_wait_seconds",
+    "Time spent waiting for a free browser pool slot",
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+)
+search_cache_requests = Counter(
+    "search_cache_requests_total",
+    "Keyword search lookups by result (hit / db_hit / coalesced / miss / bypass)",
+    labelnames=("result",),
+    registry=REGISTRY,
+)
+
+# --- HTTP / DB ---
+http_request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    labelnames=("method", "endpoint", "status"),
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+)
+response_cache_requests = Counter(
+    "response_cache_requests_total",
+    "Conditional GET outcomes for cached listings (not_modified / hit / miss)",
+    labelnames=("endpoint", "result"),
+    registry=REGISTRY,
+)
+db_query_seconds = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time, attributed to the endpoint or job that issued it",
+    labelnames=("endpoint",),
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+)
+
+# --- キュー / プール（/metrics の取得時に値を入れる）---
+job_queue_depth = Gauge("job_queue_depth", "Jobs by status", labelnames=("status",), registry=REGISTRY)
+notification_queue_depth = Gauge("notification_queue_depth", "Discord notifications waiting to be sent", registry=REGISTRY)
+browser_pool_in_use = Gauge("browser_pool_in_use", "Pages currently checked out of the browser pool", registry=REGISTRY)
+browser_pool_capacity = Gauge("browser_pool_capacity", "Maximum concurrent pages in the browser pool", registry=REGISTRY)
+browser_pool_launches = Gauge("browser_pool_launches", "Chromium launches since startup (including recycles)", registry=REGISTRY)
+startup_phase_seconds = Gauge("startup_phase_seconds", "Duration of each startup phase of this process", labelnames=("phase",), registry=REGISTRY)
+
+
+def record_sources(sources: dict):
+    for field, source in (sources or {}).items():
+        extraction_sources.labels(field=field, source=source or "none").inc()
+
+
+def endpoint_label() -> str:
+    value = current_endpoint.get()
+    if isinstance(value, dict):
+        # ルーティング後は scope["route"] にマッチしたルートが入る
+        route = value.get("route")
+        return getattr(route, "path", "unmatched")
+    return value
+
+
+def instrument_engine(engine):
+    """エンジンの全クエリについて、実行時間を発行元のエンドポイントごとに記録する"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if starts:
+            db_query_seconds.labels(endpoint=endpoint_label()).observe(time.perf_counter() - starts.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        # 失敗したクエリの開始時刻が残らないようにする
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
@@ -0,0 +1,52 @@
+"""initial schema (products, price_histories)
+
+既存環境では create_all で作成済みのため、存在しないテーブルだけを作成する。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # --sql (オフライン) 実行時は DB を調べられないため、空のDBとみなす
+    existing = [] if op.get_context().as_sql else sa.inspect(op.get_bind()).get_table_names()
+
+    if "products" not in existing:
+        op.create_table(
+            "products",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("item_id", sa.String()),
+            sa.Column("name", sa.String()),
+            sa.Column("url", sa.String()),
+            sa.Column("image_url", sa.String()),
+            sa.Column("searched_keyword", sa.String()),
+            sa.Column("is_tracking", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+        op.create_index("ix_products_id", "products", ["id"])
+        op.create_index("ix_products_item_id", "products", ["item_id"], unique=True)
+        op.create_index("ix_products_searched_keyword", "products", ["searched_keyword"])
+
+    if "price_histories" not in existing:
+        op.create_table(
+            "price_histories",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE")),
+            sa.Column("price", sa.Integer()),
+            sa.Column("scraped_at", sa.DateTime()),
+        )
+        op.create_index("ix_price_histories_id", "price_histories", ["id"])
+
+
+def downgrade():
+    op.drop_table("price_histories")
+    op.drop_table("products")
@@ -0,0 +1,74 @@
+"""indexes for hot price_histories queries and cascading FK
+
+- price_histories(product_id, scraped_at DESC) の複合インデックス
+- 検索条件カード(url = 'search://...')の部分ユニークインデックス
+- price_histories.product_id を ON DELETE CASCADE の外部キーに張り替え
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 大きなテーブルを長時間ロックしないよう CONCURRENTLY で作成する
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_price_histories_product_id_scraped_at",
+            "price_histories",
+            ["product_id", sa.text("scraped_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    # 同じキーワードの検索条件カードが重複していれば、古いもの(最小id)だけ残す
+    op.execute("""
+        DELETE FROM products p
+        USING products keep
+        WHERE p.url LIKE 'search://%'
+          AND keep.url = p.url
+          AND keep.id < p.id
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_products_search_url",
+            "products",
+            ["url"],
+            unique=True,
+            postgresql_where=sa.text("url LIKE 'search://%'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    # 既存の外部キー（CASCADEなし、または未作成）を張り替える。
+    # 既存の孤児行は NOT VALID で検証を後回しにし、新規行からは制約を効かせる
+    if op.get_context().as_sql:
+        op.execute("ALTER TABLE price_histories DROP CONSTRAINT IF EXISTS price_histories_product_id_fkey")
+    else:
+        for fk in sa.inspect(op.get_bind()).get_foreign_keys("price_histories"):
+            if fk.get("name"):
+                op.drop_constraint(fk["name"], "price_histories", type_="foreignkey")
+    op.execute("""
+        ALTER TABLE price_histories
+        ADD CONSTRAINT price_histories_product_id_fkey
+        FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE
+        NOT VALID
+    """)
+
+
+def downgrade():
+    op.drop_constraint("price_histories_product_id_fkey", "price_histories", type_="foreignkey")
+    op.create_foreign_key(
+        "price_histories_product_id_fkey", "price_histories", "products",
+        ["product_id"], ["id"],
+    )
+    op.drop_index("uq_products_search_url", table_name="products")
+    op.drop_index("ix_price_histories_product_id_scraped_at", table_name="price_histories")
@@ -0,0 +1,28 @@
+"""keyword_watermarks table for incremental keyword re-scans
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "keyword_watermarks",
+        sa.Column("keyword", sa.String(), primary_key=True),
+        sa.Column("last_created", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("recent_item_ids", sa.JSON()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("keyword_watermarks")
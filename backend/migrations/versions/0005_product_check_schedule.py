@@ -0,0 +1,26 @@
+"""per-product check schedule (last_checked_at, next_check_at)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("products", sa.Column("last_checked_at", sa.DateTime()))
+    op.add_column("products", sa.Column("next_check_at", sa.DateTime()))
+    op.create_index("ix_products_next_check_at", "products", ["next_check_at"])
+
+
+def downgrade():
+    op.drop_index("ix_products_next_check_at", table_name="products")
+    op.drop_column("products", "next_check_at")
+    op.drop_column("products", "last_checked_at")
@@ -0,0 +1,26 @@
+"""price_histories.last_seen for run-length history
+
+既存行の last_seen は NULL のまま（読み出し側で scraped_at とみなす）。
+大きなテーブルを一括 UPDATE して長時間ロックしないため、バックフィルはしない。
+重複行の圧縮は compaction.py のジョブで行う。
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("price_histories", sa.Column("last_seen", sa.DateTime()))
+
+
+def downgrade():
+    op.drop_column("price_histories", "last_seen")
@@ -0,0 +1,55 @@
+"""price_rollups table (daily / weekly buckets) with backfill
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "price_rollups",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("resolution", sa.String(), nullable=False),
+        sa.Column("bucket", sa.DateTime(), nullable=False),
+        sa.Column("open_price", sa.Integer()),
+        sa.Column("open_at", sa.DateTime()),
+        sa.Column("min_price", sa.Integer()),
+        sa.Column("max_price", sa.Integer()),
+        sa.Column("last_price", sa.Integer()),
+        sa.Column("last_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("product_id", "resolution", "bucket"),
+    )
+
+    # 既存の履歴から集計を作成する（孤児行は対象外）
+    for resolution in ("day", "week"):
+        op.execute(f"""
+            INSERT INTO price_rollups
+                (product_id, resolution, bucket, open_price, open_at, min_price, max_price, last_price, last_at)
+            SELECT
+                h.product_id,
+                '{resolution}',
+                date_trunc('{resolution}', h.scraped_at),
+                (array_agg(h.price ORDER BY h.scraped_at, h.id))[1],
+                min(h.scraped_at),
+                min(h.price),
+                max(h.price),
+                (array_agg(h.price ORDER BY h.scraped_at DESC, h.id DESC))[1],
+                max(h.scraped_at)
+            FROM price_histories h
+            JOIN products p ON p.id = h.product_id
+            WHERE h.scraped_at IS NOT NULL
+            GROUP BY h.product_id, date_trunc('{resolution}', h.scraped_at)
+        """)
+
+
+def downgrade():
+    op.drop_table("price_rollups")
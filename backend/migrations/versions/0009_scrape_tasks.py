@@ -0,0 +1,49 @@
+"""scrape_tasks table for standalone scrape workers
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scrape_tasks",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("params", sa.JSON()),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE")),
+        sa.Column("job_id", sa.Integer()),
+        sa.Column("status", sa.String(), nullable=False, server_default="queued"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column("available_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("lease_owner", sa.String()),
+        sa.Column("lease_expires_at", sa.DateTime()),
+        sa.Column("last_error", sa.Text()),
+        sa.Column("result", sa.JSON()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+    op.create_index(
+        "ix_scrape_tasks_queued", "scrape_tasks", ["available_at", "id"],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.create_index(
+        "ix_scrape_tasks_running_lease", "scrape_tasks", ["lease_expires_at"],
+        postgresql_where=sa.text("status = 'running'"),
+    )
+    op.create_index("ix_scrape_tasks_job_id", "scrape_tasks", ["job_id"])
+    op.create_index("ix_scrape_tasks_product_id", "scrape_tasks", ["product_id"])
+
+
+def downgrade():
+    op.drop_table("scrape_tasks")
@@ -0,0 +1,30 @@
+"""search_cache table for shared keyword search results
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "search_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("keyword", sa.String(), nullable=False),
+        sa.Column("items", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_search_cache_expires_at", "search_cache", ["expires_at"])
+
+
+def downgrade():
+    op.drop_table("search_cache")
@@ -0,0 +1,28 @@
+"""data_versions table for conditional GET on product listings
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "data_versions",
+        sa.Column("scope", sa.String(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.execute("INSERT INTO data_versions (scope, version, updated_at) VALUES ('products', 0, now())")
+
+
+def downgrade():
+    op.drop_table("data_versions")
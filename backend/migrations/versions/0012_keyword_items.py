@@ -0,0 +1,61 @@
+"""keywords and keyword_items (many-to-many keyword <-> product membership)
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "keywords",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("keyword", sa.String(), nullable=False, unique=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "keyword_items",
+        sa.Column("keyword_id", sa.Integer(), sa.ForeignKey("keywords.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("first_seen", sa.DateTime(), nullable=False),
+        sa.Column("last_seen", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("keyword_id", "product_id"),
+    )
+    op.create_index("ix_keyword_items_product_id", "keyword_items", ["product_id"])
+
+    # 既存の searched_keyword から作る（検索条件カードのキーワードも含める）
+    op.execute("""
+        INSERT INTO keywords (keyword, created_at)
+        SELECT searched_keyword, min(created_at)
+        FROM products
+        WHERE searched_keyword IS NOT NULL
+        GROUP BY searched_keyword
+    """)
+    op.execute("""
+        INSERT INTO keyword_items (keyword_id, product_id, first_seen, last_seen)
+        SELECT
+            k.id,
+            p.id,
+            COALESCE(p.created_at, now()),
+            COALESCE(
+                (SELECT max(COALESCE(h.last_seen, h.scraped_at)) FROM price_histories h WHERE h.product_id = p.id),
+                p.created_at,
+                now()
+            )
+        FROM products p
+        JOIN keywords k ON k.keyword = p.searched_keyword
+        WHERE p.url NOT LIKE 'search://%'
+    """)
+
+
+def downgrade():
+    op.drop_table("keyword_items")
+    op.drop_table("keywords")
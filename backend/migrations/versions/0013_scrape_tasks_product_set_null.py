@@ -0,0 +1,30 @@
+"""keep scrape_tasks rows when their product is deleted
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 売り切れで商品を削除しても、そのタスクの結果（outcome=deleted）は残して集計に使う
+    op.drop_constraint("scrape_tasks_product_id_fkey", "scrape_tasks", type_="foreignkey")
+    op.create_foreign_key(
+        "scrape_tasks_product_id_fkey", "scrape_tasks", "products",
+        ["product_id"], ["id"], ondelete="SET NULL",
+    )
+
+
+def downgrade():
+    op.drop_constraint("scrape_tasks_product_id_fkey", "scrape_tasks", type_="foreignkey")
+    op.create_foreign_key(
+        "scrape_tasks_product_id_fkey", "scrape_tasks", "products",
+        ["product_id"], ["id"], ondelete="CASCADE",
+    )
@@ -0,0 +1,31 @@
+"""split data_versions into shards
+
+- 1行の data_versions をすべての書き込みが更新すると、同時にコミットする書き込み同士が
+  行ロックで直列になるため、"products:0" 〜 "products:N" の複数行に分ける
+- 既存の版数はそのまま "products:0" に引き継ぐ（ETag が過去の値に戻らないように）
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE data_versions SET scope = 'products:0' WHERE scope = 'products'")
+
+
+def downgrade():
+    op.execute("""
+        INSERT INTO data_versions (scope, version, updated_at)
+        SELECT 'products', COALESCE(sum(version), 0), max(updated_at)
+        FROM data_versions
+        WHERE scope LIKE 'products:%'
+    """)
+    op.execute("DELETE FROM data_versions WHERE scope LIKE 'products:%'")
@@ -0,0 +1,44 @@
+"""backfill products.created_at and make it NOT NULL
+
+一覧のキーセットページングは (created_at, id) をカーソルにするため、
+created_at が NULL の商品があるとカーソルを作れず、比較からも漏れる。
+NULL の行は最初の価格履歴の時刻（なければ現在時刻）で埋める。
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        UPDATE products p
+        SET created_at = COALESCE(
+            (SELECT min(h.scraped_at) FROM price_histories h WHERE h.product_id = p.id),
+            now()
+        )
+        WHERE p.created_at IS NULL
+    """)
+    op.alter_column(
+        "products", "created_at",
+        existing_type=sa.DateTime(),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+
+
+def downgrade():
+    op.alter_column(
+        "products", "created_at",
+        existing_type=sa.DateTime(),
+        nullable=True,
+        server_default=None,
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Boolean, Index, Text, JSON, PrimaryKeyConstraint, text, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base 
@@ -11,15 +11,179 @@ class Product(Base):
     name = Column(String)
     url = Column(String)
     image_url = Column(String)
+    # 最初にこの商品を取り込んだキーワード（キーワードとの対応は keyword_items を使う）
     searched_keyword = Column(String, index=True)
     is_tracking = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now)
+    # 一覧のカーソルに使うため NULL にしない
+    created_at = Column(DateTime, nullable=False, default=datetime.now, server_default=func.now())
+    # 自動チェックのスケジュール（scheduler.py）。NULL はすぐにチェック対象
+    last_checked_at = Column(DateTime)
+    next_check_at = Column(DateTime, index=True)
+
+    __table_args__ = (
+        # 一覧のキーセットページング (created_at DESC, id DESC) 用
+        Index("ix_products_created_at_id", created_at.desc(), id.desc()),
+        # 検索条件カード(search://...)はキーワードごとに1件だけ
+        Index(
+            "uq_products_search_url", "url",
+            unique=True,
+            postgresql_where=text("url LIKE 'search://%'"),
+        ),
+    )
 
 class PriceHistory(Base):
     __tablename__ = "price_histories"
     
     id = Column(Integer, primary_key=True, index=True)
-    # CASCADE設定も入れておきましょう（DB作り直し時に有効になります）
+    # 既存DBの外部キーもマイグレーション 0002 で CASCADE に張り替え済み
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
     price = Column(Integer)
+    # 履歴は「価格が同じだった期間」を1行で表す: scraped_at = 初めてその価格を観測した時刻、
+    # last_seen = 最後にその価格を観測した時刻（NULL の古い行は scraped_at と同じとみなす）
     scraped_at = Column(DateTime, default=datetime.now)
+    last_seen = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # 「商品ごとの最新価格」「履歴を時系列で取得」の両方で使う
+        Index("ix_price_histories_product_id_scraped_at", "product_id", scraped_at.desc()),
+    )
+
+class Job(Base):
+    """時間のかかるスクレイピング処理のジョブ（Postgres上のキュー）"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    params = Column(JSON, default=dict)
+    # queued / running / succeeded / failed
+    status = Column(String, nullable=False, default="queued")
+    total = Column(Integer)
+    processed = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    result = Column(JSON)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+
+    __table_args__ = (
+        # 待ちジョブの取り出し用
+        Index("ix_jobs_status_id", "status", "id"),
+    )
+
+class KeywordWatermark(Base):
+    """キーワードごとに、前回の検索で取り込んだ最新アイテムの位置（差分スキャン用）"""
+    __tablename__ = "keyword_watermarks"
+
+    keyword = Column(String, primary_key=True)
+    # 取り込み済みアイテムの中で最も新しい出品日時（UNIX秒）
+    last_created = Column(BigInteger, nullable=False, default=0)
+    # 取り込み済みの新しい順のアイテムID（出品日時が同じアイテムの判定用）
+    recent_item_ids = Column(JSON, default=list)
+    updated_at = Column(DateTime, default=datetime.now)
+
+class Keyword(Base):
+    """取り込み対象の検索キーワード"""
+    __tablename__ = "keywords"
+
+    id = Column(Integer, primary_key=True)
+    keyword = Column(String, nullable=False, unique=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+class KeywordItem(Base):
+    """
+    キーワードと商品の対応（多対多）。複数のキーワードの検索結果に出る商品も、
+    商品・価格履歴は1件ずつで、キーワードごとにこの行だけを持つ。
+    """
+    __tablename__ = "keyword_items"
+
+    keyword_id = Column(Integer, ForeignKey("keywords.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    # このキーワードの検索結果に初めて / 最後に現れた時刻
+    first_seen = Column(DateTime, nullable=False, default=datetime.now)
+    last_seen = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        # キーワードごとの一覧は主キー (keyword_id, product_id) の範囲で引く
+        PrimaryKeyConstraint("keyword_id", "product_id"),
+        # 商品の削除（CASCADE）と、他のキーワードにも属しているかの判定用
+        Index("ix_keyword_items_product_id", "product_id"),
+    )
+
+class PriceRollup(Base):
+    """価格履歴の日次・週次の集計（チャート用）。履歴の追加時に差分で更新する"""
+    __tablename__ = "price_rollups"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    # "day" / "week"
+    resolution = Column(String, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    open_price = Column(Integer)
+    open_at = Column(DateTime)
+    min_price = Column(Integer)
+    max_price = Column(Integer)
+    last_price = Column(Integer)
+    last_at = Column(DateTime)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("product_id", "resolution", "bucket"),
+    )
+
+class ScrapeTask(Base):
+    """
+    スクレイピング1件分のタスク（worker.py が SKIP LOCKED で取り出して実行する）。
+    実行中のタスクはリース (lease_expires_at) を持ち、期限切れになったものは他のワーカーが引き継ぐ。
+    """
+    __tablename__ = "scrape_tasks"
+
+    id = Column(BigInteger, primary_key=True)
+    # "item"（商品ページのチェック）/ "search"（キーワード検索の取り込み）
+    kind = Column(String, nullable=False)
+    params = Column(JSON, default=dict)
+    # 商品が削除されても（売り切れなど）、タスクの結果は集計のために残す
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="SET NULL"))
+    # 親ジョブ（check-all / track-keyword）。進捗の集計に使う
+    job_id = Column(Integer)
+    # queued / running / succeeded / failed
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    # 再試行のバックオフ中はこの時刻まで取り出さない
+    available_at = Column(DateTime, nullable=False, default=datetime.now)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    last_error = Column(Text)
+    result = Column(JSON)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_scrape_tasks_queued", "available_at", "id", postgresql_where=text("status = 'queued'")),
+        Index("ix_scrape_tasks_running_lease", "lease_expires_at", postgresql_where=text("status = 'running'")),
+        Index("ix_scrape_tasks_job_id", "job_id"),
+        Index("ix_scrape_tasks_product_id", "product_id"),
+    )
+
+class SearchCacheEntry(Base):
+    """キーワード検索結果のキャッシュ（SEARCH_CACHE_DB=1 のとき、再起動後やワーカー間で共有する）"""
+    __tablename__ = "search_cache"
+
+    # 正規化したキーワードと検索条件（search_cache.cache_key）
+    key = Column(String, primary_key=True)
+    keyword = Column(String, nullable=False)
+    items = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class DataVersion(Base):
+    """
+    データの更新ごとに増える版数（GET /products の ETag 用）。
+    商品・価格履歴を書き込んだトランザクションが、コミット直前にシャード（"products:0" など）の1行を +1 する（response_cache.py）。
+    "history:<product_id>" は履歴の圧縮など、最新行以外を書き換えたときに進める商品ごとの版数。
+    """
+    __tablename__ = "data_versions"
+
+    scope = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now)
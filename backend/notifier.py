@@ -0,0 +1,151 @@
+import os
+import logging
+import asyncio
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# .envから取得
+DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+
+# 最初の通知を受け取ってから、まとめて送るために待つ時間（秒）
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "3"))
+# 送信待ちキューの上限（超えた分は捨てる）
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "1000"))
+# 1通あたりの最大件数・失敗時の再試行回数
+NOTIFY_MAX_ITEMS_PER_MESSAGE = 10
+NOTIFY_MAX_RETRIES = 5
+
+# Discord の content の上限（文字数）
+DISCORD_CONTENT_LIMIT = 2000
+
+
+def format_price_drop(product_name, old_price, new_price, url) -> str:
+    return (
+        f"商品: {product_name}\n"
+        f"価格: {old_price:,}円 -> **{new_price:,}円**\n"
+        f"URL: {url}"
+    )
+
+
+def build_digests(entries) -> list:
+    """通知を Discord の文字数・件数の上限に収まるメッセージに分割する"""
+    messages = []
+    current, count = "", 0
+    for entry in entries:
+        header = "📉 **値下げ通知！**\n" if not current else "\n\n"
+        # 1件だけで上限を超える場合は切り詰める
+        entry = entry[:DISCORD_CONTENT_LIMIT - 100]
+        if current and (count >= NOTIFY_MAX_ITEMS_PER_MESSAGE or len(current) + len(header) + len(entry) > DISCORD_CONTENT_LIMIT):
+            messages.append(current)
+            current, count = "", 0
+            header = "📉 **値下げ通知！**\n"
+        current += header + entry
+        count += 1
+    if current:
+        messages.append(current)
+    return messages
+
+
+class NotificationDispatcher:
+    """
+    値下げ通知をキューに溜め、バックグラウンドでまとめて Discord に送る。
+    スクレイピングや DB のトランザクションが Webhook の応答を待たないようにする。
+    """
+
+    def __init__(self, webhook_url: str = DISCORD_WEBHOOK_URL):
+        self.webhook_url = webhook_url
+        self._queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        self._task = None
+        self._client = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def notify_price_drop(self, product_name, old_price, new_price, url):
+        """値下げ通知を送信待ちに積む（DB へのコミット後に呼ぶ）"""
+        if not self.webhook_url:
+            return
+        try:
+            self._queue.put_nowait(format_price_drop(product_name, old_price, new_price, url))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Discord通知キューが満杯のため破棄: {product_name}")
+
+    async def start(self):
+        if not self.webhook_url or self._task is not None:
+            return
+        self._client = httpx.AsyncClient(timeout=10.0)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        if self._task is None:
+            return
+        # 残っている通知を送り切ってから止める
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Discord通知: 未送信 {self.depth} 件を残して停止")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self._client.aclose()
+        self._client = None
+
+    async def _collect(self) -> list:
+        """最初の1件を待ち、少し待ってからその間に溜まった分もまとめて取り出す"""
+        entries = [await self._queue.get()]
+        await asyncio.sleep(NOTIFY_COALESCE_SECONDS)
+        while not self._queue.empty():
+            entries.append(self._queue.get_nowait())
+        return entries
+
+    async def _run(self):
+        while True:
+            entries = await self._collect()
+            try:
+                for message in build_digests(entries):
+                    await self._send(message)
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    async def _send(self, content: str):
+        for attempt in range(NOTIFY_MAX_RETRIES):
+            try:
+                response = await self._client.post(self.webhook_url, json={"content": content})
+            except httpx.HTTPError as e:
+                logger.warning(f"Discord通知失敗: {e}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            if response.status_code == 429:
+                # レート制限: Discord が指定する retry_after（秒）だけ待って再送
+                try:
+                    retry_after = float(response.json().get("retry_after", 1))
+                except Exception:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                logger.info(f"Discord通知: レート制限のため {retry_after}s 待機")
+                await asyncio.sleep(retry_after)
+                continue
+            if response.status_code >= 500:
+                await asyncio.sleep(2 ** attempt)
+                continue
+            if response.status_code >= 400:
+                logger.error(f"Discord通知失敗: HTTP {response.status_code} {response.text[:200]}")
+                self.failed += 1
+                return
+
+            self.sent += 1
+            return
+
+        self.failed += 1
+        logger.error("Discord通知失敗: 再試行回数の上限に達しました")
+
+
+# アプリ全体で共有するインスタンス（main.py の startup/shutdown で起動・停止）
+notifier = NotificationDispatcher()
@@ -0,0 +1,57 @@
+from sqlalchemy import select, true, func
+
+from models import Product, PriceHistory, Keyword, KeywordItem
+
+
+def _recent_price(offset: int, name: str):
+    """商品ごとに、新しい順で offset 番目の価格履歴を1件だけ取る LATERAL サブクエリ"""
+    return (
+        select(
+            PriceHistory.price.label("price"),
+            PriceHistory.scraped_at.label("scraped_at"),
+            # 最後にこの価格を観測した時刻（古い行は last_seen が NULL）
+            func.coalesce(PriceHistory.last_seen, PriceHistory.scraped_at).label("last_seen"),
+        )
+        .where(PriceHistory.product_id == Product.id)
+        .order_by(PriceHistory.scraped_at.desc(), PriceHistory.id.desc())
+        .offset(offset)
+        .limit(1)
+        .lateral(name)
+    )
+
+
+def products_with_prices(*criteria):
+    """
+    商品一覧を最新価格・前回価格付きで1クエリで取得する。
+    商品ごとに履歴を引き直す N+1 を避けるため、LATERAL JOIN でまとめて取得する。
+    """
+    latest = _recent_price(0, "latest")
+    previous = _recent_price(1, "previous")
+    return (
+        select(
+            Product,
+            latest.c.price.label("current_price"),
+            latest.c.last_seen.label("last_scraped_at"),
+            previous.c.price.label("previous_price"),
+        )
+        .select_from(Product)
+        .outerjoin(latest, true())
+        .outerjoin(previous, true())
+        .where(*criteria)
+        .order_by(Product.created_at.desc(), Product.id.desc())
+    )
+
+
+def keyword_members(keyword: str):
+    """キーワードの検索結果に現れた商品IDのサブクエリ（keyword_items の主キーで引く）"""
+    return (
+        select(KeywordItem.product_id)
+        .join(Keyword, Keyword.id == KeywordItem.keyword_id)
+        .where(Keyword.keyword == keyword)
+    )
+
+
+def price_change(current_price, previous_price):
+    if current_price is None or previous_price is None:
+        return None
+    return current_price - previous_price
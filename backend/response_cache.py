@@ -0,0 +1,239 @@
+import os
+import re
+import random
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from sqlalchemy import event, select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from models import DataVersion, PriceHistory
+from metrics import response_cache_requests
+
+# メモリに保持するレスポンスの数と、1件あたりの上限サイズ（これより大きいものは保持しない）
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+PRODUCTS_SCOPE = "products"
+# 商品ごとの履歴の版数（古い行を書き換える処理だけが進める。history_version を参照）
+HISTORY_SCOPE = "history"
+# 版数を分ける行数。書き込むトランザクションはこのうち1行だけを更新するので、
+# 同時にコミットする書き込み同士が同じ行のロックを待ち合わせにくくなる
+DATA_VERSION_SHARDS = int(os.getenv("DATA_VERSION_SHARDS", "16"))
+# 書き込まれると一覧・履歴の内容が変わるテーブル
+TRACKED_TABLES = {"products", "price_histories", "price_rollups"}
+TRACKED_SQL = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+(?:" + "|".join(TRACKED_TABLES) + r")\b",
+    re.IGNORECASE,
+)
+
+
+# --- 書き込みの検出（どのプロセスのセッションでも、コミット時に data_versions を進める） ---
+
+def _mark_changed(session):
+    session.info["data_changed"] = True
+
+
+def history_scope(product_id: int) -> str:
+    return f"{HISTORY_SCOPE}:{product_id}"
+
+
+def mark_history_changed(db, product_ids):
+    """
+    最新行以外の履歴を書き換えた商品（圧縮など）を記録し、コミット時にその商品の履歴の版数を進める。
+    最新行の追加・last_seen の更新は history_version がそのまま検出するので呼ばなくてよい。
+    """
+    session = getattr(db, "sync_session", db)
+    session.info.setdefault("history_changed", set()).update(product_ids)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_execute(state):
+    statement = state.statement
+    if state.is_insert or state.is_update or state.is_delete:
+        if getattr(statement, "table", None) is not None and statement.table.name in TRACKED_TABLES:
+            _mark_changed(state.session)
+    elif isinstance(statement, TextClause) and TRACKED_SQL.search(statement.text):
+        _mark_changed(state.session)
+
+
+@event.listens_for(Session, "after_flush")
+def _on_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in TRACKED_TABLES:
+            _mark_changed(session)
+            return
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_version(session):
+    # before_commit はコミット時の flush より前に呼ばれるため、未反映の変更を先に flush して検出する
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    # 行ロックを持つのはコミットまでの一瞬だけになるよう、トランザクションの最後に更新する。
+    # 更新する行はシャードから無作為に選ぶ（読む側は全シャードの合計を版数にする）
+    if session.info.pop("data_changed", False):
+        now = datetime.now()
+        stmt = pg_insert(DataVersion).values(
+            scope=f"{PRODUCTS_SCOPE}:{random.randrange(DATA_VERSION_SHARDS)}", version=1, updated_at=now
+        )
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[DataVersion.scope],
+            set_={"version": DataVersion.version + 1, "updated_at": now},
+        ))
+    product_ids = session.info.pop("history_changed", None)
+    if product_ids:
+        now = datetime.now()
+        # 複数の書き込みが同じ行を逆順にロックしないよう、商品ID順に更新する
+        stmt = pg_insert(DataVersion).values([
+            {"scope": history_scope(product_id), "version": 1, "updated_at": now}
+            for product_id in sorted(product_ids)
+        ])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[DataVersion.scope],
+            set_={"version": DataVersion.version + 1, "updated_at": now},
+        ))
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    session.info.pop("data_changed", None)
+    session.info.pop("history_changed", None)
+
+
+# --- バージョンの取得 ---
+
+async def products_version(db):
+    """
+    (ETag, 最終更新時刻)。各シャードの版数は増えるだけなので、合計も書き込みのたびに必ず変わる。
+    まだ書き込みがなければ版数 0・最終更新時刻なしになる。
+    """
+    version, updated_at = (await db.execute(
+        select(func.coalesce(func.sum(DataVersion.version), 0), func.max(DataVersion.updated_at))
+        .where(DataVersion.scope.like(f"{PRODUCTS_SCOPE}:%"))
+    )).one()
+    return f'"p{version}"', updated_at
+
+
+async def history_version(db, product_id: int):
+    """
+    商品ごとの価格履歴の (ETag, 最終更新時刻)。履歴の行数によらず、インデックスを引く2回の1行取得で済む。
+    - 最新行 (product_id, scraped_at DESC) の id と last_seen: 行の追加・last_seen の更新で変わる
+    - data_versions の商品ごとの版数: 圧縮など、古い行の書き換えで進む（mark_history_changed）
+    """
+    latest = (await db.execute(
+        select(PriceHistory.id, func.coalesce(PriceHistory.last_seen, PriceHistory.scraped_at))
+        .where(PriceHistory.product_id == product_id)
+        .order_by(PriceHistory.scraped_at.desc(), PriceHistory.id.desc())
+        .limit(1)
+    )).one_or_none()
+    counter = (await db.execute(
+        select(DataVersion.version, DataVersion.updated_at).where(DataVersion.scope == history_scope(product_id))
+    )).one_or_none()
+    latest_id, last_seen = latest or (0, None)
+    version, rewritten_at = counter or (0, None)
+    stamp = int(last_seen.timestamp() * 1000) if last_seen else 0
+    last_modified = max(filter(None, (last_seen, rewritten_at)), default=None)
+    return f'"h{product_id}-{latest_id}-{stamp}-{version}"', last_modified
+
+
+# --- レスポンスのキャッシュ ---
+
+def _last_modified_utc(value: datetime) -> datetime:
+    """
+    HTTP 日付は秒単位なので、秒未満を切り上げる（同じ秒のうちに後から書き込まれた変更を 304 で隠さないように）。
+    DB の時刻はローカル時刻（タイムゾーンなし）で保存している。
+    """
+    value = value.astimezone(timezone.utc)
+    if value.microsecond:
+        value = value.replace(microsecond=0) + timedelta(seconds=1)
+    return value
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(_last_modified_utc(value), usegmt=True)
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # 返した Last-Modified をそのまま送り返された場合も 304 にする（RFC 9110: 指定時刻以前の更新なら未変更）
+        return _last_modified_utc(last_modified) <= since
+    return False
+
+
+class ResponseCache:
+    """
+    ETag ごとに JSON レスポンスの本文を保持する LRU。
+    データが書き込まれると ETag が変わるため、古い本文は使われずに追い出される。
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+
+    def get(self, key: str, etag: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def put(self, key: str, etag: str, body: bytes, headers: dict):
+        if len(body) > self.max_bytes:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (etag, body, headers)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def respond(self, request: Request, version, build, endpoint: str):
+        """
+        If-None-Match / If-Modified-Since が一致すれば 304 を返し、行は読まない。
+        同じ ETag の本文を保持していればそれを返し、なければ build() で作って保持する。
+        """
+        if version is None:
+            return await build()
+        etag, last_modified = version
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if last_modified:
+            headers["Last-Modified"] = _http_date(last_modified)
+
+        if _not_modified(request, etag, last_modified):
+            response_cache_requests.labels(endpoint=endpoint, result="not_modified").inc()
+            return Response(status_code=304, headers=headers)
+
+        key = f"{request.url.path}?{request.url.query}"
+        cached = self.get(key, etag)
+        if cached is not None:
+            response_cache_requests.labels(endpoint=endpoint, result="hit").inc()
+            body, extra_headers = cached
+            return Response(body, media_type="application/json", headers={**extra_headers, **headers})
+
+        response_cache_requests.labels(endpoint=endpoint, result="miss").inc()
+        response = await build()
+        if not isinstance(response, Response):
+            response = JSONResponse(jsonable_encoder(response))
+        if not isinstance(response, StreamingResponse):
+            extra_headers = {k: v for k, v in response.headers.items() if k.lower().startswith("x-")}
+            self.put(key, etag, response.body, extra_headers)
+        response.headers.update(headers)
+        return response
+
+
+response_cache = ResponseCache()
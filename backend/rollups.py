@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, text, case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import PriceRollup
+
+# 集計テーブルに保持する粒度（それより細かい粒度は price_histories からその場で集計する）
+ROLLUP_RESOLUTIONS = ("day", "week")
+RESOLUTIONS = ("raw", "hour", "day", "week")
+
+
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    """Postgres の date_trunc と同じ区切り（週は月曜始まり）"""
+    if resolution == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def auto_resolution(start: datetime, end: datetime) -> str:
+    """表示期間に応じて、チャートの点数が多くなりすぎない粒度を選ぶ"""
+    span = end - start
+    if span <= timedelta(days=7):
+        return "raw"
+    if span <= timedelta(days=60):
+        return "hour"
+    if span <= timedelta(days=730):
+        return "day"
+    return "week"
+
+
+async def update_rollups(db, observations):
+    """
+    追加した履歴行 (product_id, price, scraped_at) を日次・週次の集計に反映する。
+    コミットは呼び出し側で行う。
+    """
+    if not observations:
+        return
+    for resolution in ROLLUP_RESOLUTIONS:
+        buckets = {}
+        for product_id, price, scraped_at in observations:
+            key = (product_id, bucket_start(scraped_at, resolution))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = {
+                    "product_id": product_id,
+                    "resolution": resolution,
+                    "bucket": key[1],
+                    "open_price": price, "open_at": scraped_at,
+                    "min_price": price, "max_price": price,
+                    "last_price": price, "last_at": scraped_at,
+                }
+                continue
+            row["min_price"] = min(row["min_price"], price)
+            row["max_price"] = max(row["max_price"], price)
+            if scraped_at < row["open_at"]:
+                row["open_price"], row["open_at"] = price, scraped_at
+            if scraped_at >= row["last_at"]:
+                row["last_price"], row["last_at"] = price, scraped_at
+
+        stmt = pg_insert(PriceRollup).values(list(buckets.values()))
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PriceRollup.product_id, PriceRollup.resolution, PriceRollup.bucket],
+            set_={
+                "min_price": func.least(PriceRollup.min_price, excluded.min_price),
+                "max_price": func.greatest(PriceRollup.max_price, excluded.max_price),
+                "open_price": case((excluded.open_at < PriceRollup.open_at, excluded.open_price), else_=PriceRollup.open_price),
+                "open_at": func.least(PriceRollup.open_at, excluded.open_at),
+                "last_price": case((excluded.last_at >= PriceRollup.last_at, excluded.last_price), else_=PriceRollup.last_price),
+                "last_at": func.greatest(PriceRollup.last_at, excluded.last_at),
+            },
+        )
+        await db.execute(stmt)
+
+
+# 集計テーブルにない粒度（hour）は price_histories から SQL で集計する
+# （価格が変わらなかった区間のバケットは history_series で前の価格を引き継いで埋める）
+BUCKETED_HISTORY_SQL = text("""
+SELECT
+    date_trunc(:resolution, scraped_at) AS bucket,
+    min(scraped_at) AS open_at,
+    (array_agg(price ORDER BY scraped_at, id))[1] AS open_price,
+    min(price) AS min_price,
+    max(price) AS max_price,
+    (array_agg(price ORDER BY scraped_at DESC, id DESC))[1] AS last_price
+FROM price_histories
+WHERE product_id = :product_id AND scraped_at >= :start AND scraped_at < :end
+GROUP BY 1
+ORDER BY 1
+""")
+
+# 履歴の1行は scraped_at〜last_seen の区間なので、期間と重なる行をすべて返す
+# （期間の開始前から価格が変わっていない行も含める）
+RAW_HISTORY_SQL = text("""
+SELECT scraped_at, price, COALESCE(last_seen, scraped_at) AS last_seen
+FROM price_histories
+WHERE product_id = :product_id AND scraped_at < :end AND COALESCE(last_seen, scraped_at) >= :start
+ORDER BY scraped_at, id
+""")
+
+# 最初のバケットより前から続いている価格と、最後に観測した時刻
+CARRY_PRICE_SQL = text("""
+SELECT
+    (SELECT price FROM price_histories
+     WHERE product_id = :product_id AND scraped_at < :start
+     ORDER BY scraped_at DESC, id DESC LIMIT 1) AS price,
+    (SELECT max(COALESCE(last_seen, scraped_at)) FROM price_histories
+     WHERE product_id = :product_id) AS last_seen
+""")
+
+
+def next_bucket(bucket: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return bucket + timedelta(hours=1)
+    if resolution == "week":
+        return bucket + timedelta(weeks=1)
+    return bucket + timedelta(days=1)
+
+
+def fill_buckets(rows, first: datetime, end: datetime, until: datetime, carry, resolution: str) -> list:
+    """
+    価格の変化があったバケットだけの集計行に、変化のなかった区間のバケットを補う。
+    carry は最初のバケットより前から続いている価格。価格は次の変化まで続くものとして扱い、
+    最後に観測した時刻 (until) より後のバケットは作らない。
+    戻り値は (bucket, open, min, max, last) のリスト。
+    """
+    by_bucket = {r.bucket: r for r in rows}
+    filled = []
+    bucket = first
+    while bucket < end and until is not None and bucket <= until:
+        row = by_bucket.get(bucket)
+        if row is not None:
+            open_price, min_price, max_price = row.open_price, row.min_price, row.max_price
+            # バケットの途中で価格が変わった場合、それまでは前の価格だった
+            if carry is not None and row.open_at > bucket:
+                open_price = carry
+                min_price, max_price = min(min_price, carry), max(max_price, carry)
+            filled.append((bucket, open_price, min_price, max_price, row.last_price))
+            carry = row.last_price
+        elif carry is not None:
+            filled.append((bucket, carry, carry, carry, carry))
+        bucket = next_bucket(bucket, resolution)
+    return filled
+
+
+async def history_series(db, product_id: int, start: datetime, end: datetime, resolution: str) -> dict:
+    """
+    価格履歴を列指向（同じ長さの配列の組）で返す。
+    raw: t / price / last_seen、それ以外: t / open / min / max / last
+    """
+    params = {"product_id": product_id, "start": start, "end": end}
+
+    if resolution == "raw":
+        rows = (await db.execute(RAW_HISTORY_SQL, params)).all()
+        return {
+            "resolution": resolution,
+            "t": [r.scraped_at for r in rows],
+            "price": [r.price for r in rows],
+            "last_seen": [r.last_seen for r in rows],
+        }
+
+    # 期間の開始を含むバケットから集計し、前から続いている価格を引き継ぐ
+    first = bucket_start(start, resolution)
+    params["start"] = first
+    if resolution in ROLLUP_RESOLUTIONS:
+        stmt = (
+            select(
+                PriceRollup.bucket,
+                PriceRollup.open_at,
+                PriceRollup.open_price,
+                PriceRollup.min_price,
+                PriceRollup.max_price,
+                PriceRollup.last_price,
+            )
+            .where(
+                PriceRollup.product_id == product_id,
+                PriceRollup.resolution == resolution,
+                PriceRollup.bucket >= first,
+                PriceRollup.bucket < end,
+            )
+            .order_by(PriceRollup.bucket)
+        )
+        rows = (await db.execute(stmt)).all()
+    else:
+        rows = (await db.execute(BUCKETED_HISTORY_SQL, {**params, "resolution": resolution})).all()
+
+    carry, until = (await db.execute(CARRY_PRICE_SQL, {"product_id": product_id, "start": first})).one()
+    buckets = fill_buckets(rows, first, end, until, carry, resolution)
+    return {
+        "resolution": resolution,
+        "t": [b[0] for b in buckets],
+        "open": [b[1] for b in buckets],
+        "min": [b[2] for b in buckets],
+        "max": [b[3] for b in buckets],
+        "last": [b[4] for b in buckets],
+    }
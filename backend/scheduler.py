@@ -0,0 +1,194 @@
+import os
+import logging
+import time
+import random
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func, or_, and_
+
+from database import async_session
+from models import Product, PriceHistory
+from queries import products_with_prices
+from checker import check_products
+from compaction import enqueue_compaction
+from metrics import current_endpoint
+from scrape_tasks import distributed, enqueue_item_checks, pending_task_exists, prune_finished_tasks
+
+logger = logging.getLogger(__name__)
+
+# アプリ起動時に自動チェックを開始するか
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+# 期限が来た商品を探す間隔（秒）と、1回に処理する最大件数
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "60"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "50"))
+# チェック間隔の下限・上限（分）と、同時刻に集中しないための揺らぎ（割合）
+CHECK_MIN_INTERVAL_MINUTES = float(os.getenv("CHECK_MIN_INTERVAL_MINUTES", "30"))
+CHECK_MAX_INTERVAL_MINUTES = float(os.getenv("CHECK_MAX_INTERVAL_MINUTES", "1440"))
+CHECK_INTERVAL_JITTER = float(os.getenv("CHECK_INTERVAL_JITTER", "0.1"))
+# 価格履歴の重複行を圧縮するジョブを投入する間隔（時間）。0で無効
+COMPACTION_INTERVAL_HOURS = float(os.getenv("COMPACTION_INTERVAL_HOURS", "24"))
+
+# 出品から何日以内を「新しい出品」とみなすか / 値下げから何日以内を「売れそう」とみなすか
+NEW_LISTING_DAYS = 7
+RECENT_DROP_DAYS = 3
+
+
+def compute_interval(
+    changes_per_day: float,
+    age_days: float,
+    recently_dropped: bool,
+    rng: random.Random = random,
+) -> timedelta:
+    """
+    次のチェックまでの間隔を決める。
+    価格がよく動く / 出品が新しい / 最近値下げされた（売り切れやすい）商品ほど短くする。
+    """
+    score = 1.0
+    # 価格変動の頻度（1日1回以上の変動で最大）
+    score += 6.0 * min(changes_per_day, 1.0)
+    if age_days < NEW_LISTING_DAYS:
+        score += 2.0
+    if recently_dropped:
+        score += 3.0
+
+    minutes = CHECK_MAX_INTERVAL_MINUTES / score
+    minutes = min(max(minutes, CHECK_MIN_INTERVAL_MINUTES), CHECK_MAX_INTERVAL_MINUTES)
+    minutes *= 1.0 + rng.uniform(-CHECK_INTERVAL_JITTER, CHECK_INTERVAL_JITTER)
+    return timedelta(minutes=minutes)
+
+
+async def reschedule(product_ids) -> int:
+    """チェック済みの商品について、価格履歴から次回チェック時刻を計算して保存する"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    now = datetime.now()
+
+    async with async_session() as db:
+        # 商品ごとの履歴件数・期間を1クエリで集計
+        stats_stmt = (
+            select(
+                PriceHistory.product_id,
+                func.count(PriceHistory.id),
+                func.min(PriceHistory.scraped_at),
+                func.max(PriceHistory.scraped_at),
+            )
+            .where(PriceHistory.product_id.in_(product_ids))
+            .group_by(PriceHistory.product_id)
+        )
+        stats = {
+            pid: (count, first, last_change)
+            for pid, count, first, last_change in (await db.execute(stats_stmt)).all()
+        }
+
+        rows = (await db.execute(products_with_prices(Product.id.in_(product_ids)))).all()
+        for p, current_price, last_scraped_at, previous_price in rows:
+            # 履歴の各行は価格が変わった時点で始まるので、scraped_at の最大値が最後の変動時刻
+            count, first_seen, last_change = stats.get(p.id, (0, None, None))
+            observed_days = max((now - first_seen).total_seconds() / 86400, 1.0) if first_seen else 1.0
+            # 履歴は価格が変わったときだけ行が増えるので、件数-1 が変動回数
+            changes_per_day = max(count - 1, 0) / observed_days
+            age_days = (now - p.created_at).total_seconds() / 86400 if p.created_at else 0.0
+            recently_dropped = (
+                current_price is not None and previous_price is not None
+                and current_price < previous_price
+                and last_change is not None
+                and now - last_change < timedelta(days=RECENT_DROP_DAYS)
+            )
+            interval = compute_interval(changes_per_day, age_days, recently_dropped)
+            await db.execute(
+                update(Product)
+                .where(Product.id == p.id)
+                .values(last_checked_at=now, next_check_at=now + interval)
+            )
+        await db.commit()
+    return len(rows)
+
+
+async def run_due_checks(limit: int = SCHEDULER_BATCH_SIZE) -> dict:
+    """期限が来た商品だけをチェックし、次回の予定を入れ直す"""
+    async with async_session() as db:
+        stmt = (
+            select(Product.id, Product.name, Product.url)
+            .where(
+                and_(
+                    Product.is_tracking == True,
+                    ~Product.url.startswith("search://"),
+                    or_(Product.next_check_at.is_(None), Product.next_check_at <= datetime.now()),
+                )
+            )
+            .order_by(Product.next_check_at.asc().nulls_first())
+            .limit(limit)
+        )
+        if distributed():
+            # ワーカーに渡したがまだ終わっていない商品は積み直さない
+            stmt = stmt.where(~pending_task_exists(Product.id))
+        products = (await db.execute(stmt)).all()
+
+        if distributed() and products:
+            # チェックと次回予定の入れ直しは worker.py が行う
+            await enqueue_item_checks(db, products)
+            await db.commit()
+            logger.info(f"Scheduler: enqueued {len(products)} scrape tasks")
+            return {"checked": len(products), "updated": 0, "deleted": 0, "errors": 0}
+
+    if not products:
+        return {"checked": 0, "updated": 0, "deleted": 0, "errors": 0}
+
+    counts = await check_products(products)
+    # 売り切れで削除された商品は対象外になる
+    await reschedule(p.id for p in products)
+    logger.info(f"Scheduler: checked {counts['checked']} products", extra=counts)
+    return counts
+
+
+class Scheduler:
+    """アプリと一緒に起動する、商品ごとの自動チェックのループ"""
+
+    def __init__(self, tick_seconds: float = SCHEDULER_TICK_SECONDS):
+        self.tick_seconds = tick_seconds
+        self._task = None
+        self._last_compaction = time.monotonic()
+
+    async def start(self):
+        if not SCHEDULER_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Scheduler: started (tick {self.tick_seconds}s)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _maybe_compact(self):
+        if COMPACTION_INTERVAL_HOURS <= 0:
+            return
+        if time.monotonic() - self._last_compaction < COMPACTION_INTERVAL_HOURS * 3600:
+            return
+        self._last_compaction = time.monotonic()
+        job = await enqueue_compaction()
+        logger.info(f"Scheduler: enqueued history compaction (job {job.id})")
+        if distributed():
+            pruned = await prune_finished_tasks()
+            logger.info(f"Scheduler: pruned {pruned} finished scrape tasks")
+
+    async def _loop(self):
+        current_endpoint.set("scheduler")
+        while True:
+            try:
+                await self._maybe_compact()
+                counts = await run_due_checks()
+                # まだ期限切れの商品が残っていれば待たずに続ける
+                if counts["checked"] >= SCHEDULER_BATCH_SIZE:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Scheduler: tick failed: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+
+scheduler = Scheduler()
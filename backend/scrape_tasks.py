@@ -0,0 +1,243 @@
+import os
+import random
+import logging
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, delete, func, or_, and_
+
+from database import async_session
+from models import ScrapeTask
+from search_cache import search_cache
+from ingest import ingest_search_items, load_watermark, save_watermark
+
+logger = logging.getLogger(__name__)
+
+# inline: API プロセス内でスクレイピングする / distributed: scrape_tasks に積んで worker.py に任せる
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "inline")
+# タスクのリース期間（秒）。ハートビートで延長され、途絶えると他のワーカーが引き継ぐ
+SCRAPE_LEASE_SECONDS = float(os.getenv("SCRAPE_LEASE_SECONDS", "120"))
+# 再試行の上限回数と、バックオフの初回・最大の待ち時間（秒）
+SCRAPE_MAX_ATTEMPTS = int(os.getenv("SCRAPE_MAX_ATTEMPTS", "5"))
+SCRAPE_RETRY_BASE_SECONDS = float(os.getenv("SCRAPE_RETRY_BASE_SECONDS", "30"))
+SCRAPE_RETRY_MAX_SECONDS = float(os.getenv("SCRAPE_RETRY_MAX_SECONDS", "1800"))
+# 完了したタスクを残しておく日数
+SCRAPE_TASK_RETENTION_DAYS = float(os.getenv("SCRAPE_TASK_RETENTION_DAYS", "7"))
+# 親ジョブがタスクの完了を確認する間隔（秒）
+TASK_WAIT_POLL_SECONDS = 2.0
+
+
+def distributed() -> bool:
+    return SCRAPE_MODE == "distributed"
+
+
+def retry_delay(attempts: int, rng: random.Random = random) -> timedelta:
+    """指数バックオフ（±20% の揺らぎ付き）。attempts は失敗した回数"""
+    seconds = min(SCRAPE_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), SCRAPE_RETRY_MAX_SECONDS)
+    return timedelta(seconds=seconds * rng.uniform(0.8, 1.2))
+
+
+async def run_search(keyword: str, incremental: bool = True) -> dict:
+    """キーワードで検索し、結果を取り込んでウォーターマークを進める"""
+    watermark = None
+    if incremental:
+        async with async_session() as db:
+            watermark = await load_watermark(db, keyword)
+
+    logger.info(f"Starting background scrape for: {keyword}", extra={"keyword": keyword, "incremental": watermark is not None})
+    # 直前にプレビュー (GET /search) した結果が残っていれば、スクレイピングせずに取り込む
+    scraped_items = await search_cache.search(keyword, watermark=watermark)
+
+    # 取得した全アイテムをDBに保存（INSERT ... ON CONFLICT で一括処理）
+    async with async_session() as db:
+        counts = await ingest_search_items(db, keyword, scraped_items)
+        await save_watermark(db, keyword, scraped_items)
+        await db.commit()
+
+    return {
+        "keyword": keyword,
+        "incremental": watermark is not None,
+        "items_count": len(scraped_items),
+        "new_items_count": counts["new_count"],
+        # 他のキーワードで取り込み済みの商品を含む、このキーワードに新たに加わった件数
+        "new_members_count": counts["new_members"],
+        "history_count": counts["history_count"]
+    }
+
+
+# --- キューへの投入（API 側） ---
+
+async def enqueue_item_checks(db, products, job_id: int = None) -> int:
+    """(id, name, url) のリストを商品チェックのタスクとして積む。コミットは呼び出し側で行う"""
+    rows = [
+        {
+            "kind": "item",
+            "params": {"name": name, "url": url},
+            "product_id": product_id,
+            "job_id": job_id,
+            "status": "queued",
+            "max_attempts": SCRAPE_MAX_ATTEMPTS,
+            "available_at": datetime.now(),
+            "created_at": datetime.now(),
+        }
+        for product_id, name, url in products
+    ]
+    for i in range(0, len(rows), 1000):
+        await db.execute(insert(ScrapeTask), rows[i:i + 1000])
+    return len(rows)
+
+
+async def enqueue_search(db, keyword: str, incremental: bool, job_id: int = None) -> ScrapeTask:
+    task = ScrapeTask(
+        kind="search",
+        params={"keyword": keyword, "incremental": incremental},
+        job_id=job_id,
+        status="queued",
+        max_attempts=SCRAPE_MAX_ATTEMPTS,
+        available_at=datetime.now(),
+        created_at=datetime.now(),
+    )
+    db.add(task)
+    return task
+
+
+def pending_task_exists(product_id_column):
+    """指定した商品に、待機中・実行中のタスクがあるか（スケジューラの重複投入防止用）"""
+    return (
+        select(ScrapeTask.id)
+        .where(ScrapeTask.product_id == product_id_column, ScrapeTask.status.in_(["queued", "running"]))
+        .exists()
+    )
+
+
+async def wait_for_job_tasks(job_id: int, progress=None) -> dict:
+    """親ジョブのタスクがすべて終わるまで待ち、状態ごとの件数を progress に反映する"""
+    while True:
+        async with async_session() as db:
+            counts = dict((await db.execute(
+                select(ScrapeTask.status, func.count(ScrapeTask.id))
+                .where(ScrapeTask.job_id == job_id)
+                .group_by(ScrapeTask.status)
+            )).all())
+        done = counts.get("succeeded", 0) + counts.get("failed", 0)
+        if progress is not None and done > progress.processed:
+            progress.errors = counts.get("failed", 0)
+            await progress.advance(done - progress.processed)
+        if not counts.get("queued") and not counts.get("running"):
+            return counts
+        await asyncio.sleep(TASK_WAIT_POLL_SECONDS)
+
+
+async def job_task_results(job_id: int) -> list:
+    async with async_session() as db:
+        return list((await db.execute(
+            select(ScrapeTask.status, ScrapeTask.result).where(ScrapeTask.job_id == job_id)
+        )).all())
+
+
+# --- 取り出し・完了報告（ワーカー側） ---
+
+async def claim_tasks(owner: str, limit: int) -> list:
+    """
+    実行可能なタスクを最大 limit 件取り出してリースを取る。
+    待機中で available_at を過ぎたもの、またはリースが切れた実行中のもの（落ちたワーカーの分）が対象。
+    """
+    now = datetime.now()
+    async with async_session() as db:
+        stmt = (
+            select(ScrapeTask)
+            .where(or_(
+                and_(ScrapeTask.status == "queued", ScrapeTask.available_at <= now),
+                and_(ScrapeTask.status == "running", ScrapeTask.lease_expires_at < now),
+            ))
+            .order_by(ScrapeTask.available_at, ScrapeTask.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        tasks = list((await db.execute(stmt)).scalars().all())
+        for task in tasks:
+            if task.status == "running":
+                logger.warning(f"ScrapeTask {task.id}: lease of {task.lease_owner} expired, taking over")
+            task.status = "running"
+            task.attempts += 1
+            task.lease_owner = owner
+            task.lease_expires_at = now + timedelta(seconds=SCRAPE_LEASE_SECONDS)
+        await db.commit()
+        return tasks
+
+
+async def extend_leases(owner: str, task_ids) -> int:
+    """実行中のタスクのリースを延長する（ハートビート）"""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return 0
+    async with async_session() as db:
+        result = await db.execute(
+            update(ScrapeTask)
+            .where(ScrapeTask.id.in_(task_ids), ScrapeTask.lease_owner == owner, ScrapeTask.status == "running")
+            .values(lease_expires_at=datetime.now() + timedelta(seconds=SCRAPE_LEASE_SECONDS))
+        )
+        await db.commit()
+        return result.rowcount
+
+
+async def _update_owned(task_id: int, owner: str, **values) -> bool:
+    async with async_session() as db:
+        result = await db.execute(
+            update(ScrapeTask)
+            .where(ScrapeTask.id == task_id, ScrapeTask.lease_owner == owner, ScrapeTask.status == "running")
+            .values(**values)
+        )
+        await db.commit()
+    if not result.rowcount:
+        # リースが切れて他のワーカーに引き継がれていた
+        logger.warning(f"ScrapeTask {task_id}: lease lost before completion")
+        return False
+    return True
+
+
+async def complete_task(task: ScrapeTask, owner: str, result: dict) -> bool:
+    return await _update_owned(
+        task.id, owner,
+        status="succeeded", result=result, finished_at=datetime.now(),
+        lease_owner=None, lease_expires_at=None,
+    )
+
+
+async def fail_task(task: ScrapeTask, owner: str, error: str) -> bool:
+    """失敗を記録する。上限回数までは available_at を後ろにずらして再試行させる"""
+    if task.attempts >= task.max_attempts:
+        logger.error(f"ScrapeTask {task.id}: giving up after {task.attempts} attempts: {error}")
+        return await _update_owned(
+            task.id, owner,
+            status="failed", last_error=error, finished_at=datetime.now(),
+            lease_owner=None, lease_expires_at=None,
+        )
+    delay = retry_delay(task.attempts)
+    logger.info(f"ScrapeTask {task.id}: attempt {task.attempts} failed, retrying in {delay.total_seconds():.0f}s: {error}")
+    return await _update_owned(
+        task.id, owner,
+        status="queued", last_error=error, available_at=datetime.now() + delay,
+        lease_owner=None, lease_expires_at=None,
+    )
+
+
+async def release_task(task: ScrapeTask, owner: str) -> bool:
+    """シャットダウン時に、実行途中のタスクを試行回数を戻して待機中に戻す"""
+    return await _update_owned(
+        task.id, owner,
+        status="queued", attempts=task.attempts - 1, available_at=datetime.now(),
+        lease_owner=None, lease_expires_at=None,
+    )
+
+
+async def prune_finished_tasks(days: float = SCRAPE_TASK_RETENTION_DAYS) -> int:
+    """保持期間を過ぎた完了・失敗タスクを削除する"""
+    async with async_session() as db:
+        result = await db.execute(
+            delete(ScrapeTask).where(
+                ScrapeTask.status.in_(["succeeded", "failed"]),
+                ScrapeTask.finished_at < datetime.now() - timedelta(days=days),
+            )
+        )
+        await db.commit()
+        return result.rowcount
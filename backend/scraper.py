@@ -1,123 +1,156 @@
-import re
 import os
-import json
+import logging
 import asyncio
 import urllib.parse
-from playwright.async_api import async_playwright
+from browser_pool import browser_pool
+from html_extract import fetch_item_fast, clean_name
+from metrics import scrape_phase_seconds, scrape_results, record_sources
+import debug_artifacts
+
+logger = logging.getLogger(__name__)
 
 # 環境変数からベースURLを取得
 BASE_SEARCH_URL = os.getenv("SEARCH_URL")
+# 商品ページのベースURL（ベンチマーク用のスタブサーバーに向けるときに上書きする）
+ITEM_BASE_URL = os.getenv("ITEM_BASE_URL", "https://jp.mercari.com").rstrip("/")
+
+
+def item_url(item_id: str, shops: bool = False) -> str:
+    if shops:
+        return f"{ITEM_BASE_URL}/shops/product/{item_id}"
+    return f"{ITEM_BASE_URL}/item/{item_id}"
 
 # 個別商品ページ用 (通常出品 & Shops 両対応版)
 async def scrape_site(url: str):
-    print(f"--- [START SCRAPE] URL: {url} ---")
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
+    logger.debug(f"[START SCRAPE] URL: {url}")
+    # まずはブラウザを使わずHTMLだけで解析し、足りない場合のみ Playwright を使う
+    with scrape_phase_seconds.labels(kind="item", phase="fast_path").time():
+        result = await fetch_item_fast(url)
+    if result:
+        logger.debug(f"[END SCRAPE] Fast path - Name: {result['name']}, Price: {result['price']}")
+        path = "fast"
+    else:
+        result = await _scrape_with_browser(url)
+        path = "browser"
+    scrape_results.labels(path=path, status=result["status"]).inc()
+    if result["status"] == "success":
+        record_sources(result.get("sources"))
+    return result
+
+# 商品ページの読み込み完了判定: 売り切れ表示が出ているか、価格が取れてかつ在庫状況が分かる状態なら準備完了。
+# 在庫状況は JSON-LD の availability か、購入ボタン・売り切れボタンの表示で判断する
+# （価格だけ先に出た時点で判定すると、売り切れボタンの描画前に読んでしまうため）
+ITEM_READY_JS = """() => {
+    const buttons = Array.from(document.querySelectorAll('button'));
+    const soldOut = buttons.some(b => b.disabled && (b.textContent || '').includes('売り切れました'));
+    if (soldOut) return true;
+
+    let price = false, availability = false;
+    for (const s of document.querySelectorAll('script[type="application/ld+json"]')) {
+        const text = s.textContent || '';
+        if (text.includes('"price"')) price = true;
+        if (text.includes('"availability"')) availability = true;
+    }
+    if (document.querySelector('meta[property="product:price:amount"]')) price = true;
+    const el = document.querySelector('[data-testid="product-price"]');
+    if (el && /[0-9]/.test(el.textContent || '')) price = true;
+    if (!price) return false;
+
+    const purchase = buttons.some(b => !b.disabled && (b.textContent || '').includes('購入'));
+    return availability || purchase;
+}"""
+
+# 商品情報を1回の evaluate でまとめて取得する（各項目の取得元も返す）
+ITEM_EXTRACT_JS = """() => {
+    const result = {
+        name: null, price: null, image_url: null, sold_out: false,
+        sources: { name: null, price: null, image_url: null }
+    };
+
+    // --- 1. 売り切れ判定 ---
+    result.sold_out = Array.from(document.querySelectorAll('button[disabled]'))
+        .some(b => (b.textContent || '').includes('売り切れました'));
+
+    // --- 2. データ取得 (JSON-LD 方式) ---
+    for (const s of document.querySelectorAll('script[type="application/ld+json"]')) {
+        try {
+            const data = JSON.parse(s.textContent);
+            const items = (data && !Array.isArray(data)) ? (data['@graph'] || [data]) : [];
+            const product = items.find(item => item && item['@type'] === 'Product');
+            if (!product) continue;
+            const offers = product.offers || {};
+            const offer = Array.isArray(offers) ? (offers[0] || {}) : offers;
+            if (product.name) { result.name = product.name; result.sources.name = 'ld_json'; }
+            if (offer.price) { result.price = parseInt(offer.price); result.sources.price = 'ld_json'; }
+            if (product.image) { result.image_url = product.image; result.sources.image_url = 'ld_json'; }
+            break;
+        } catch (e) {
+            continue;
+        }
+    }
+
+    // --- 3. 補完処理 (JSON-LDで取れなかった場合) ---
+    const meta = (property) => {
+        const el = document.querySelector(`meta[property="${property}"]`);
+        return el ? el.getAttribute('content') : null;
+    };
+    if (!result.name && meta('og:title')) {
+        result.name = meta('og:title'); result.sources.name = 'meta';
+    }
+    if (!result.price && meta('product:price:amount')) {
+        result.price = parseInt(meta('product:price:amount')) || null;
+        if (result.price) result.sources.price = 'meta';
+    }
+    // Shops専用セレクタ [data-testid="product-price"]
+    if (!result.price) {
+        const el = document.querySelector('[data-testid="product-price"]');
+        const digits = el ? (el.innerText || el.textContent || '').replace(/[^0-9]/g, '') : '';
+        if (digits) { result.price = parseInt(digits); result.sources.price = 'selector'; }
+    }
+    if (!result.image_url && meta('og:image')) {
+        result.image_url = meta('og:image'); result.sources.image_url = 'meta';
+    }
+    if (Array.isArray(result.image_url)) result.image_url = result.image_url[0] || null;
+    return result;
+}"""
+
+# 読み込み完了を待つ最大時間（ミリ秒）。過ぎても取れるだけ取得する
+ITEM_READY_TIMEOUT_MS = int(os.getenv("ITEM_READY_TIMEOUT_MS", "10000"))
+
+
+async def extract_item(page) -> dict:
+    """表示中のページから商品情報を取り出す"""
+    try:
+        await page.wait_for_function(ITEM_READY_JS, timeout=ITEM_READY_TIMEOUT_MS)
+    except Exception as e:
+        logger.debug(f"Item page not ready within {ITEM_READY_TIMEOUT_MS}ms: {e}")
+    found = await page.evaluate(ITEM_EXTRACT_JS)
+    if found["name"] and found["sources"]["name"] == "meta":
+        found["name"] = clean_name(found["name"])
+    return found
+
+
+async def extract_item_from_html(html: str) -> dict:
+    """保存済みHTMLを page.set_content() で読み込み、extract_item を実行する（bench/fixtures での確認用）"""
+    async with browser_pool.page() as page:
+        await page.set_content(html, wait_until="domcontentloaded")
+        return await extract_item(page)
+
+
+async def _scrape_with_browser(url: str):
+    # 共有ブラウザプールから独立したコンテキストのページを借りる
+    async with browser_pool.page(policy="item") as page:
         try:
-            print(f"DEBUG: Opening page...")
             # タイムアウトを1分に設定
             page.set_default_timeout(60000)
-            await page.goto(url, wait_until="domcontentloaded")
-            # ページ読み込み後、JavaScriptの実行を少し待つ
-            await page.wait_for_timeout(2000)
-            print(f"DEBUG: Page loaded. Current URL: {page.url}")
-
-            # --- 1. 売り切れ判定 ---
-            is_sold_out = False
-            sold_out_btn = await page.query_selector('button[disabled] >> text="売り切れました"')
-            if sold_out_btn:
-                is_sold_out = True
-            print(f"DEBUG: is_sold_out = {is_sold_out}")
-
-            # --- 2. データ取得 (JSON-LD 方式) ---
-            print(f"DEBUG: Attempting JSON-LD extraction...")
-            scripts = await page.locator('script[type="application/ld+json"]').all_inner_texts()
-            name, price, image_url = None, None, None
-            
-            print(f"DEBUG: Found {len(scripts)} LD+JSON scripts.")
-            for i, s in enumerate(scripts):
-                try:
-                    data = json.loads(s)
-                    items = data.get("@graph", [data]) if isinstance(data, dict) else []
-                    for item in items:
-                        if item.get("@type") == "Product":
-                            name = item.get("name")
-                            image_url = item.get("image")
-                            offers = item.get("offers", {})
-                            # 価格の抽出 (数値として取得)
-                            price_val = offers[0].get("price") if isinstance(offers, list) else offers.get("price")
-                            if price_val:
-                                price = int(price_val)
-                            print(f"DEBUG: Found Product in script {i}: {name}, {price}")
-                            break
-                except Exception as e:
-                    print(f"DEBUG: Error parsing script {i}: {e}")
-                    continue
-
-            # --- 3. 補完処理 (JSON-LDで取れなかった場合) ---
-            
-            # 商品名
-            if not name:
-                name = await page.get_attribute('meta[property="og:title"]', "content")
-                if name: 
-                    # 末尾のショップ名を削るなどのクリーンアップ
-                    name = name.replace(" - メルカリ", "").replace(" - ピットスポーツ", "").strip()
-                    print(f"DEBUG: Name from Meta: {name}")
-
-            # 価格 (ここがShopsで重要)
-            if not price:
-                # A. メタタグを確認 (query_selectorを使うことで例外を回避)
-                price_meta_el = await page.query_selector('meta[property="product:price:amount"]')
-                if price_meta_el:
-                    price_str = await price_meta_el.get_attribute("content")
-                    if price_str:
-                        price = int(price_str)
-                        print(f"DEBUG: Price from Meta: {price}")
-                
-                # B. Shops専用セレクタ [data-testid="product-price"] を確認
-                if not price:
-                    print(f"DEBUG: Searching for [data-testid='product-price']...")
-                    price_locator = page.locator('[data-testid="product-price"]')
-                    
-                    try:
-                        # 要素が出現するまで最大5秒待機
-                        await price_locator.wait_for(state="visible", timeout=5000)
-                        
-                        # inner_text を取得
-                        price_raw = await price_locator.inner_text()
-                        
-                        # inner_text が空の場合は textContent (より低レイヤー) を試す
-                        if not price_raw or not price_raw.strip():
-                            price_raw = await price_locator.evaluate("el => el.textContent")
-                        
-                        print(f"DEBUG: Raw Price Text: '{price_raw}'")
-                        
-                        if price_raw:
-                            digits = re.sub(r'[^0-9]', '', price_raw)
-                            if digits:
-                                price = int(digits)
-                                print(f"DEBUG: Price from TestID Selector: {price}")
-                    except Exception as e:
-                        print(f"DEBUG: Price element wait failed or not found: {e}")
-
-            # 画像
-            if not image_url:
-                img_meta_el = await page.query_selector('meta[property="og:image"]')
-                if img_meta_el:
-                    image_url = await img_meta_el.get_attribute("content")
-                    print(f"DEBUG: Image from Meta: {bool(image_url)}")
-
-            # ここを追加
-            if isinstance(image_url, list) and len(image_url) > 0:
-                image_url = image_url[0]
-            elif isinstance(image_url, list):
-                image_url = None
-
-            print(f"--- [END SCRAPE] Final - Name: {name}, Price: {price} ---")
+            with scrape_phase_seconds.labels(kind="item", phase="goto").time():
+                await page.goto(url, wait_until="domcontentloaded")
+            logger.debug(f"Page loaded. Current URL: {page.url}")
+
+            with scrape_phase_seconds.labels(kind="item", phase="extraction").time():
+                found = await extract_item(page)
+            name, price, image_url = found["name"], found["price"], found["image_url"]
+            logger.debug(f"[END SCRAPE] Final - Name: {name}, Price: {price}, Sources: {found['sources']}")
 
             # --- 4. 返却判定 ---
             if name and price:
@@ -126,138 +159,211 @@ async def scrape_site(url: str):
                     "name": name, 
                     "price": int(price), 
                     "image_url": str(image_url) if image_url else None,
-                    "sold_out": is_sold_out
+                    "sold_out": found["sold_out"],
+                    "sources": found["sources"]
                 }
             
+            await debug_artifacts.capture(page, url.rstrip("/").rsplit("/", 1)[-1], "missing")
             return {"status": "error", "message": f"Required data missing. Name: {name}, Price: {price}"}
 
         except Exception as e:
-            print(f"DEBUG: Exception occurred: {e}")
+            logger.warning(f"Browser scrape failed for {url}: {e}")
+            await debug_artifacts.capture(page, url.rstrip("/").rsplit("/", 1)[-1], "error")
             return {"status": "error", "message": str(e)}
-        finally:
-            await browser.close()
 
-async def search_items(keyword: str):
-    encoded_keyword = urllib.parse.quote(keyword)
-    search_url = f"{BASE_SEARCH_URL}/search/?keyword={encoded_keyword}&status=on_sale&sort=created_time&order=desc"
-    
-    async with async_playwright() as p:
-        print(f"--- Starting Scraping for: {keyword} ---")
-        # エックスサーバー等の環境に合わせ、余計なリソースを読み込まない設定
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
-        
-        found_items = {}
-        last_count = 0
-        same_count_limit = 0
+# 検索APIのレスポンスを識別するURLの一部
+SEARCH_API_PATTERN = os.getenv("SEARCH_API_PATTERN", "/v2/entities:search")
+# 1キーワードで集める件数の目安と、たどるページ数の上限
+SEARCH_TARGET_COUNT = int(os.getenv("SEARCH_TARGET_COUNT", "120"))
+SEARCH_MAX_PAGES = int(os.getenv("SEARCH_MAX_PAGES", "10"))
+# 検索APIのレスポンスを待つ最大時間（秒）
+SEARCH_RESPONSE_TIMEOUT = float(os.getenv("SEARCH_RESPONSE_TIMEOUT", "20"))
 
-        try:
-            print(f"[DEBUG] Navigating to: {search_url}")
+# 検索APIのレスポンスが取れなかった場合の予備策: __NEXT_DATA__ を直接パース
+NEXT_DATA_EXTRACT_JS = '''async ([searchKeyword, itemBaseUrl]) => {
+        try {
+            const nextDataEl = document.getElementById('__NEXT_DATA__');
+            if (!nextDataEl) return [];
 
-            await page.goto(search_url, wait_until="domcontentloaded", timeout=60000)
-            
-            # アイテムが表示されるまで待機
-            try:
-                await page.wait_for_selector('li[data-testid="item-cell"]', timeout=20000)
-            except Exception as te:
-                print(f"[ERROR] Timeout waiting for selector: {te}")
-                # タイムアウトしてもデータがJSONにある可能性があるので続行
-            
-            # デバッグ用：現在のHTMLをダンプ
-            html_content = await page.content()
-            with open("debug_page_source.html", "w", encoding="utf-8") as f:
-                f.write(html_content)
-            print(f"[DEBUG] HTML dumped to debug_page_source.html (Length: {len(html_content)})")
-
-            # --- 全件回収ループ ---
-            for step in range(5):  # JSON取得ならステップ数は少なめでもOK
-                print(f"[DEBUG] Step {step + 1}: Extracting data via Next.js JSON...")
-
-                # DOMを這い回るのではなく、内部JSONデータを直接パース
-                new_data = await page.evaluate('''async (searchKeyword) => {
-                    try {
-                        const nextDataEl = document.getElementById('__NEXT_DATA__');
-                        if (!nextDataEl) return [];
-
-                        const jsonData = JSON.parse(nextDataEl.innerHTML);
+            const jsonData = JSON.parse(nextDataEl.innerHTML);
         
         // メルカリの最新構造: props.pageProps.apolloState にデータが分散している場合があるため、
         // initialState と apolloState 両方をチェックする
-                        const state = jsonData.props?.pageProps?.initialState || jsonData.props?.pageProps?.apolloState || {};
+            const state = jsonData.props?.pageProps?.initialState || jsonData.props?.pageProps?.apolloState || {};
         
         // アイテム配列を保持している可能性が高いキーを網羅的に探す
-                        const items = 
-                            state.search?.searchItems?.items || 
-                            state.searchV2?.searchItems?.items ||
-                            (state.searchItems && state.searchItems.items) ||
-                            [];
-            
+            const items = 
+                state.search?.searchItems?.items || 
+                state.searchV2?.searchItems?.items ||
+                (state.searchItems && state.searchItems.items) ||
+                [];
+
         // もし上記で見つからない場合の再帰探索 (エンジニアの予備策)
-                        const findItemsRecursive = (obj) => {
-                            if (!obj || typeof obj !== 'object') return null;
-                            if (Array.isArray(obj) && obj.length > 0 && obj[0].id && obj[0].name) return obj;
-                            for (const key in obj) {
-                                if (key === 'items' && Array.isArray(obj[key])) return obj[key];
-                                const found = findItemsRecursive(obj[key]);
-                                if (found) return found;
-                            }
-                            return null;
-                        };
-
-                        const finalItems = items.length > 0 ? items : (findItemsRecursive(state) || []);
-
-                        return finalItems.map(item => ({
-                            id: item.id || item.itemId,
-                            name: item.name || "",
-                            price: parseInt(item.price) || 0,
-                            url: "https://jp.mercari.com/item/" + (item.id || item.itemId),
-                            image_url: (item.thumbnails && item.thumbnails.length > 0) ? item.thumbnails[0] : null,
-                            searched_keyword: searchKeyword 
-                        })).filter(item => item.id && item.price > 0); // 最低限のバリデーション
-                    } catch (err) {
-                        return [];
-                    }
-                }''', keyword)
+            const findItemsRecursive = (obj) => {
+                if (!obj || typeof obj !== 'object') return null;
+                if (Array.isArray(obj) && obj.length > 0 && obj[0].id && obj[0].name) return obj;
+                for (const key in obj) {
+                    if (key === 'items' && Array.isArray(obj[key])) return obj[key];
+                    const found = findItemsRecursive(obj[key]);
+                    if (found) return found;
+                }
+                return null;
+            };
+
+            const finalItems = items.length > 0 ? items : (findItemsRecursive(state) || []);
 
+            return finalItems.map(item => ({
+                id: item.id || item.itemId,
+                name: item.name || "",
+                price: parseInt(item.price) || 0,
+                url: itemBaseUrl + "/item/" + (item.id || item.itemId),
+                image_url: (item.thumbnails && item.thumbnails.length > 0) ? item.thumbnails[0] : null,
+                searched_keyword: searchKeyword,
+                created: parseInt(item.created) || 0
+            })).filter(item => item.id && item.price > 0); // 最低限のバリデーション
+        } catch (err) {
+            return [];
+        }
+    }'''
+
+
+def build_search_url(keyword: str, page_token: str = None) -> str:
+    encoded_keyword = urllib.parse.quote(keyword)
+    search_url = f"{BASE_SEARCH_URL}/search/?keyword={encoded_keyword}&status=on_sale&sort=created_time&order=desc"
+    if page_token:
+        search_url += f"&page_token={urllib.parse.quote(page_token)}"
+    return search_url
+
+
+def parse_search_payload(payload: dict, keyword: str):
+    """検索APIのJSONから (アイテムのリスト, 次ページのトークン) を取り出す"""
+    items = []
+    for item in payload.get("items") or []:
+        item_id = item.get("id")
+        price = int(item.get("price") or 0)
+        # 最低限のバリデーション
+        if not item_id or price <= 0:
+            continue
+        thumbnails = item.get("thumbnails") or []
+        items.append({
+            "id": item_id,
+            "name": item.get("name") or "",
+            "price": price,
+            "url": item_url(item_id, shops=item.get("itemType") == "ITEM_TYPE_BEYOND"),
+            "image_url": thumbnails[0] if thumbnails else None,
+            "searched_keyword": keyword,
+            "created": int(item.get("created") or 0),
+        })
+    next_token = (payload.get("meta") or {}).get("nextPageToken") or None
+    return items, next_token
+
+
+def reached_watermark(items, watermark) -> bool:
+    """前回取り込んだ位置（出品日時・アイテムID）まで到達したか"""
+    if not watermark:
+        return False
+    last_created, known_ids = watermark
+    for item in items:
+        if item["id"] in known_ids:
+            return True
+        if last_created and item.get("created") and item["created"] < last_created:
+            return True
+    return False
+
+
+async def search_items(keyword: str, target_count: int = SEARCH_TARGET_COUNT, watermark=None, debug: bool = False):
+    """
+    検索ページを開き、ページが呼び出す検索APIのレスポンスをそのまま受け取ってアイテムを集める。
+    nextPageToken をたどり、target_count 件に達するか結果が尽きたら終了する。
+    watermark (最新の出品日時, 取り込み済みIDの集合) を渡すと、新着順の結果が
+    取り込み済みのアイテムに到達した時点でページ送りをやめる（差分スキャン）。
+    debug=True（またはサンプリングに当たった場合）は最終画面のHTMLとスクリーンショットを保存する。
+    """
+    search_url = build_search_url(keyword)
+
+    logger.info(f"Starting Scraping for: {keyword}")
+    async with browser_pool.page(policy="search") as page:
+        found_items = {}
+        payloads = asyncio.Queue()
+
+        async def on_response(response):
+            if SEARCH_API_PATTERN not in response.url or not response.ok:
+                return
+            try:
+                payload = await response.json()
+            except Exception as e:
+                logger.debug(f"Failed to read search API response: {e}")
+                return
+            if isinstance(payload, dict) and "items" in payload:
+                payloads.put_nowait(payload)
+
+        page.on("response", on_response)
+
+        try:
+            logger.debug(f"Navigating to: {search_url}")
+
+            with scrape_phase_seconds.labels(kind="search", phase="goto").time():
+                await page.goto(search_url, wait_until="domcontentloaded", timeout=60000)
+
+            # --- 全件回収ループ（固定の待ち時間ではなく、APIレスポンスの到着を待つ） ---
+            for page_no in range(1, SEARCH_MAX_PAGES + 1):
+                try:
+                    with scrape_phase_seconds.labels(kind="search", phase="extraction").time():
+                        payload = await asyncio.wait_for(payloads.get(), timeout=SEARCH_RESPONSE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Timeout waiting for search API response (page {page_no})")
+                    break
+
+                new_data, next_token = parse_search_payload(payload, keyword)
+                before = len(found_items)
                 for item in new_data:
                     found_items[item['id']] = item
-                
-                current_count = len(found_items)
-                print(f"[INFO] Step {step + 1}: Extracted {len(new_data)} items (Total Unique: {current_count})")
-
-                # 終了判定
-                if current_count == last_count:
-                    same_count_limit += 1
-                else:
-                    same_count_limit = 0
+                logger.info(f"Page {page_no}: Extracted {len(new_data)} items (Total Unique: {len(found_items)})")
 
-                if same_count_limit >= 2:
+                # 終了判定: 件数に達した / 次ページなし / 新しいアイテムがない
+                if len(found_items) >= target_count or not next_token or len(found_items) == before:
+                    break
+                # 差分スキャン: 前回取り込んだところまで来たら、それ以降は取得済み
+                if reached_watermark(new_data, watermark):
+                    logger.info(f"Reached previously ingested listings at page {page_no}")
                     break
-                
-                last_count = current_count
 
-                # さらに読み込ませるためにスクロール
-                await page.mouse.wheel(0, 2000)
-                await page.wait_for_timeout(2000)
+                # 前のページの残りのレスポンスは捨ててから次ページへ
+                while not payloads.empty():
+                    payloads.get_nowait()
+                with scrape_phase_seconds.labels(kind="search", phase="goto").time():
+                    await page.goto(build_search_url(keyword, next_token), wait_until="domcontentloaded", timeout=60000)
 
-            print(f"--- Scraping Finished. Total Unique: {len(found_items)} ---")
-            
-            # 最終的な画面を保存
-            await page.screenshot(path="search_result_debug.png")
+            if not found_items:
+                # APIレスポンスが取れなかった場合は __NEXT_DATA__ から取得する
+                logger.info("Falling back to __NEXT_DATA__ extraction")
+                for item in await page.evaluate(NEXT_DATA_EXTRACT_JS, [keyword, ITEM_BASE_URL]):
+                    found_items[item['id']] = item
+
+            logger.info(f"Scraping Finished. Total Unique: {len(found_items)}", extra={"keyword": keyword, "items": len(found_items)})
+
+            # 最終的な画面を保存（1件も取れなかった場合は常に保存）
+            if not found_items:
+                await debug_artifacts.capture(page, keyword, "empty")
+            elif debug or debug_artifacts.sampled():
+                await debug_artifacts.capture(page, keyword, "search")
             return list(found_items.values())
 
         except Exception as e:
-            print(f"[CRITICAL ERROR] Scraping failed: {str(e)}")
+            logger.exception(f"Scraping failed: {str(e)}")
+            await debug_artifacts.capture(page, keyword, "error")
             return []
-        finally:
-            await browser.close()
 
 # テスト実行用のブロック（main.pyからは呼ばれない）
 if __name__ == "__main__":
     import asyncio
     test_keyword = "アシックス DSライト 27.5"
-    results = asyncio.run(search_items(test_keyword))
+
+    async def _main():
+        try:
+            return await search_items(test_keyword)
+        finally:
+            await browser_pool.stop()
+
+    results = asyncio.run(_main())
     print(f"Final Found: {len(results)} items")
@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import asyncio
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import async_session
+from models import SearchCacheEntry
+from scraper import search_items, SEARCH_TARGET_COUNT
+from metrics import search_cache_requests
+
+logger = logging.getLogger(__name__)
+
+# 検索結果を使い回す時間（秒）。0でキャッシュ無効
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+# メモリに保持するキーワード数の上限（古いものから捨てる）
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256"))
+# Postgres にも保存し、再起動後やワーカー間でも使い回す
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB", "0") == "1"
+
+
+def normalize_keyword(keyword: str) -> str:
+    """全角・半角や大文字・小文字、余分な空白の違いを吸収する"""
+    return " ".join(unicodedata.normalize("NFKC", keyword).lower().split())
+
+
+def cache_key(keyword: str, target_count: int = SEARCH_TARGET_COUNT) -> str:
+    return f"{normalize_keyword(keyword)}|{target_count}"
+
+
+class SearchCache:
+    """
+    search_items の結果のキャッシュ（TTL + LRU）。
+    同じキーワードの検索が同時に来た場合は、実行中の1回のスクレイピングの結果を共有する。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        use_db: bool = SEARCH_CACHE_DB,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.use_db = use_db
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def _get_memory(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, items = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return items
+
+    def _put_memory(self, key: str, items: list, ttl: float = None):
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl_seconds), items)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_db(self, key: str):
+        async with async_session() as db:
+            entry = (await db.execute(
+                select(SearchCacheEntry).where(SearchCacheEntry.key == key, SearchCacheEntry.expires_at > datetime.now())
+            )).scalar_one_or_none()
+        if entry is None:
+            return None
+        # 残りの有効期間だけメモリにも載せる
+        self._put_memory(key, entry.items, ttl=(entry.expires_at - datetime.now()).total_seconds())
+        return entry.items
+
+    async def _put_db(self, key: str, keyword: str, items: list):
+        now = datetime.now()
+        values = {
+            "key": key,
+            "keyword": keyword,
+            "items": items,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds),
+        }
+        stmt = pg_insert(SearchCacheEntry).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SearchCacheEntry.key],
+            set_={k: stmt.excluded[k] for k in ("keyword", "items", "created_at", "expires_at")},
+        )
+        async with async_session() as db:
+            await db.execute(stmt)
+            # 期限切れの行はついでに消す
+            await db.execute(delete(SearchCacheEntry).where(SearchCacheEntry.expires_at <= now))
+            await db.commit()
+
+    async def _search(self, key: str, keyword: str, target_count: int) -> list:
+        try:
+            if self.use_db:
+                try:
+                    items = await self._get_db(key)
+                    if items is not None:
+                        search_cache_requests.labels(result="db_hit").inc()
+                        return items
+                except Exception as e:
+                    logger.warning(f"SearchCache: DB lookup failed: {e}")
+
+            search_cache_requests.labels(result="miss").inc()
+            items = await search_items(keyword, target_count=target_count)
+            # 空の結果はスクレイピング失敗の可能性があるのでキャッシュしない
+            if items:
+                self._put_memory(key, items)
+                if self.use_db:
+                    try:
+                        await self._put_db(key, keyword, items)
+                    except Exception as e:
+                        logger.warning(f"SearchCache: DB store failed: {e}")
+            return items
+        finally:
+            self._inflight.pop(key, None)
+
+    async def search(self, keyword: str, target_count: int = SEARCH_TARGET_COUNT, watermark=None) -> list:
+        """
+        キャッシュ済みの結果か、実行中の検索の結果を返す。なければスクレイピングする。
+        watermark 付き（差分スキャン）の検索は途中で打ち切られるため、キャッシュには入れない。
+        """
+        if self.ttl_seconds <= 0:
+            return await search_items(keyword, target_count=target_count, watermark=watermark)
+
+        key = cache_key(keyword, target_count)
+        items = self._get_memory(key)
+        if items is not None:
+            search_cache_requests.labels(result="hit").inc()
+            return items
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            search_cache_requests.labels(result="coalesced").inc()
+        elif watermark is not None:
+            search_cache_requests.labels(result="bypass").inc()
+            return await search_items(keyword, target_count=target_count, watermark=watermark)
+        else:
+            # 呼び出し元が切断されても、他の待ち手のために検索自体は続ける
+            flight = asyncio.create_task(self._search(key, keyword, target_count))
+            self._inflight[key] = flight
+        return await asyncio.shield(flight)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "inflight": len(self._inflight),
+            "db_tier": self.use_db,
+        }
+
+
+search_cache = SearchCache()
@@ -0,0 +1,39 @@
+import time
+import logging
+from contextlib import asynccontextmanager
+
+from metrics import startup_phase_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """起動フェーズごとの所要時間と、起動処理が完了したか（/readyz 用）"""
+
+    def __init__(self):
+        self.phases = {}
+        self.ready = False
+        # ブラウザの起動・暖機が成功したか（SCRAPE_MODE=distributed では使わない）
+        self.browser_warm = False
+        self._started = time.perf_counter()
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phases[name] = round(elapsed, 3)
+            startup_phase_seconds.labels(phase=name).set(elapsed)
+            logger.info(f"Startup phase {name}: {elapsed:.2f}s", extra={"phase": name, "seconds": round(elapsed, 3)})
+
+    def complete(self):
+        total = time.perf_counter() - self._started
+        self.phases["total"] = round(total, 3)
+        startup_phase_seconds.labels(phase="total").set(total)
+        self.ready = True
+        logger.info(f"Startup complete in {total:.2f}s", extra={"phases": self.phases})
+
+
+readiness = Readiness()
@@ -0,0 +1,165 @@
+"""
+スクレイピング専用ワーカー（API とは別のコンテナで、必要な数だけ起動する）
+
+    python worker.py
+
+scrape_tasks テーブルから SELECT ... FOR UPDATE SKIP LOCKED でタスクを取り出し、
+scrape_site / search_items を実行して結果をDBに書き戻す。API 側は SCRAPE_MODE=distributed にする。
+"""
+import os
+import socket
+import signal
+import logging
+import asyncio
+
+from logging_setup import setup_logging
+from startup import readiness
+from database import prime_pool, DB_PRIME_CONNECTIONS
+from browser_pool import browser_pool
+from html_extract import close_client
+from notifier import notifier
+from checker import check_product, HostRateLimiter
+from scheduler import reschedule
+from metrics import current_endpoint
+# 書き込み時に data_versions を進めるセッションイベントを登録する（API の ETag 用）
+import response_cache
+from scrape_tasks import (
+    SCRAPE_LEASE_SECONDS,
+    claim_tasks,
+    extend_leases,
+    complete_task,
+    fail_task,
+    release_task,
+    run_search,
+)
+
+logger = logging.getLogger(__name__)
+
+# 1ワーカーで同時に実行するタスク数（ブラウザプールの上限以下にする）
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", os.getenv("BROWSER_MAX_CONCURRENCY", "3")))
+# タスクがないときのポーリング間隔（秒）
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+# 停止時に実行中のタスクの完了を待つ最大時間（秒）
+WORKER_SHUTDOWN_GRACE_SECONDS = float(os.getenv("WORKER_SHUTDOWN_GRACE_SECONDS", "30"))
+
+
+class ScrapeWorker:
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY):
+        self.concurrency = concurrency
+        # ワーカーごとに一意な名前（リースの持ち主）
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.limiter = HostRateLimiter()
+        self._running = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        async with readiness.phase("db_pool"):
+            await prime_pool(min(self.concurrency, DB_PRIME_CONNECTIONS))
+        async with readiness.phase("browser"):
+            await browser_pool.warm()
+        await notifier.start()
+        readiness.complete()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        logger.info(f"Worker {self.owner}: started (concurrency {self.concurrency})")
+        try:
+            await self._loop()
+        finally:
+            heartbeat.cancel()
+            await self._drain()
+            await notifier.stop()
+            await browser_pool.stop()
+            await close_client()
+            logger.info(f"Worker {self.owner}: stopped")
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self._running)
+            tasks = []
+            if free > 0:
+                try:
+                    tasks = await claim_tasks(self.owner, free)
+                except Exception as e:
+                    logger.warning(f"Worker {self.owner}: claim failed: {e}")
+            for task in tasks:
+                self._running[task.id] = (task, asyncio.create_task(self._execute(task)))
+
+            # 空きがあるのに何も取れなかった / 空きがない場合は、少し待つかタスクの完了を待つ
+            if not tasks or len(self._running) >= self.concurrency:
+                waiters = [t for _, t in self._running.values()]
+                stop = asyncio.create_task(self._stopping.wait())
+                await asyncio.wait(
+                    waiters + [stop],
+                    timeout=WORKER_POLL_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                stop.cancel()
+
+    async def _execute(self, task):
+        current_endpoint.set(f"task:{task.kind}")
+        try:
+            if task.kind == "item":
+                params = task.params or {}
+                if task.product_id is None:
+                    # 実行前に商品が削除されていた
+                    await complete_task(task, self.owner, {"outcome": "skipped"})
+                    return
+                outcome = await check_product(task.product_id, params.get("name"), params["url"], self.limiter)
+                if outcome == "error":
+                    await fail_task(task, self.owner, f"スクレイピング失敗: {params.get('name')}")
+                    if task.attempts >= task.max_attempts:
+                        # 諦めた商品も次回の自動チェックまで間隔を空ける
+                        await reschedule([task.product_id])
+                    return
+                if outcome != "deleted":
+                    await reschedule([task.product_id])
+                await complete_task(task, self.owner, {"outcome": outcome})
+            elif task.kind == "search":
+                params = task.params or {}
+                result = await run_search(params["keyword"], params.get("incremental", True))
+                await complete_task(task, self.owner, result)
+            else:
+                await fail_task(task, self.owner, f"unknown task kind: {task.kind}")
+        except asyncio.CancelledError:
+            await release_task(task, self.owner)
+            raise
+        except Exception as e:
+            logger.exception(f"ScrapeTask {task.id} failed: {e}")
+            await fail_task(task, self.owner, str(e))
+        finally:
+            self._running.pop(task.id, None)
+
+    async def _heartbeat(self):
+        # リースが切れる前に延長する
+        while True:
+            await asyncio.sleep(SCRAPE_LEASE_SECONDS / 3)
+            try:
+                await extend_leases(self.owner, list(self._running))
+            except Exception as e:
+                logger.warning(f"Worker {self.owner}: heartbeat failed: {e}")
+
+    async def _drain(self):
+        """実行中のタスクは猶予時間だけ待ち、終わらなければキューに戻す"""
+        running = [t for _, t in self._running.values()]
+        if not running:
+            return
+        logger.info(f"Worker {self.owner}: waiting for {len(running)} running tasks")
+        _, pending = await asyncio.wait(running, timeout=WORKER_SHUTDOWN_GRACE_SECONDS)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def main():
+    worker = ScrapeWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
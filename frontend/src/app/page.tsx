@@ -92,9 +92,11 @@ export default function Home() {
       const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/products/${product.id}/history`);
       if (res.ok) {
         const data = await res.json();
-        const formattedData = data.map((d: any) => ({
-          price: d.price,
-          date: new Date(d.scraped_at).toLocaleDateString('ja-JP', { month: 'short', day: 'numeric', hour: '2-digit' })
+        // 列指向の形式: t[i] と price[i]（集計時は last[i]）が1点に対応する
+        const prices: number[] = data.price ?? data.last;
+        const formattedData = data.t.map((t: string, i: number) => ({
+          price: prices[i],
+          date: new Date(t).toLocaleDateString('ja-JP', { month: 'short', day: 'numeric', hour: '2-digit' })
         }));
         setHistory(formattedData);
       }
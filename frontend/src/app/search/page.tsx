@@ -55,6 +55,16 @@ export default function SearchPage() {
     }
   };
 
+  const waitForJob = async (jobId: number) => {
+    while (true) {
+      const res = await fetch(`${API_BASE}/jobs/${jobId}`);
+      if (!res.ok) throw new Error("Job status fetch failed");
+      const job = await res.json();
+      if (job.status === "succeeded" || job.status === "failed") return job;
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
   const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!keyword.trim()) return;
@@ -67,7 +77,11 @@ export default function SearchPage() {
       const data = await response.json();
       setKeyword("");
       await fetchSavedKeywords();
-      alert(`「${data.keyword}」のデータをDBに保存しました！\n取得件数: ${data.items_count}件`);
+
+      // スクレイピングはバックグラウンドジョブなので、完了するまでポーリングする
+      const job = await waitForJob(data.job_id);
+      if (job.status !== "succeeded") throw new Error(job.last_error || "Job failed");
+      alert(`「${data.keyword}」のデータをDBに保存しました！\n取得件数: ${job.result.items_count}件`);
     } catch (error) {
       console.error("検索・保存エラー:", error);
       alert("エラーが発生しました。");